@@ -0,0 +1,169 @@
+import re
+from typing import Union
+
+class ApproximateMatcher:
+    """ Finds substrings within 'max_errors' edits (insertions, deletions, substitutions) of a pattern
+
+    Remarks:
+        Two stages, so the cost per byte stays close to an exact search:
+            - filter: the pattern is split into max_errors + 1 pieces. A substring with at most max_errors edits
+              contains at least one of the pieces unchanged (pigeonhole), so only the places where a piece occurs
+              exactly (one compiled regex, like the multi-term search) are looked at.
+            - verify: around such a place, Myers' bit-parallel algorithm computes the edit distance of the pattern
+              to the substrings ending at every position of a small window, one text character per step (the
+              columns of the distance matrix are kept as bit vectors in Python ints). A second pass over the
+              reversed text finds where the best match starts.
+
+        Works on lowercased str or on lowercased bytes (ASCII pattern only). A match never spans a line ending. When
+        several substrings qualify, the one with the fewest edits is taken, of those the shortest.
+
+    Attributes:
+        pattern (str): lowercased pattern
+        max_errors (int)
+        pieces (list[str]): parts of the pattern of which at least one occurs unchanged in every match
+    Args:
+        pattern (str)
+        max_errors (int)
+    Raises:
+        ValueError: pattern too short for 'max_errors'
+    """
+
+    MIN_PIECE = 2   # Shorter pieces occur nearly everywhere, the filter would not filter
+
+    def __init__(self, pattern: str, max_errors: int):
+        if max_errors < 0 or len(pattern) < (max_errors + 1) * ApproximateMatcher.MIN_PIECE:
+            raise ValueError(f"Search text too short for {max_errors} errors (at least "
+                             f"{(max_errors + 1) * ApproximateMatcher.MIN_PIECE} characters needed)")
+
+        self.pattern = pattern.lower()
+        self.max_errors = max_errors
+
+        # Pieces of (about) equal length, with their offset in the pattern
+        size = len(self.pattern)
+        count = max_errors + 1
+        bounds = [index * size // count for index in range(count + 1)]
+        self._offsets = bounds[:-1]
+        self.pieces = [self.pattern[bounds[index]:bounds[index + 1]] for index in range(count)]
+
+        expression = "|".join(re.escape(piece) for piece in self.pieces)
+        self._filter = re.compile(expression)
+        self._byte_filter = None
+        if self.pattern.isascii():
+            self._byte_filter = re.compile(expression.encode("ascii"))
+            self._byte_pieces = [piece.encode("ascii") for piece in self.pieces]
+
+        self._masks = ApproximateMatcher._masks(self.pattern)
+        self._reversed_masks = ApproximateMatcher._masks(self.pattern[::-1])
+
+    def occurs(self, text: Union[str, bytes]) -> bool:
+        """ False when 'text' can't contain a match (none of the pieces occurs) """
+        return self.candidate(text, 0, len(text)) != -1
+
+    def candidate(self, text: Union[str, bytes], start: int, end: int) -> int:
+        """ Position of the first piece in text[start:end], -1 when none """
+        regex = self._byte_filter if isinstance(text, (bytes, bytearray)) else self._filter
+        candidate = regex.search(text, start, end)
+        return candidate.start() if candidate is not None else -1
+
+    def find(self, text: Union[str, bytes], start: int = 0, end: int = None) -> tuple[int, int, int]:
+        """ First match in text[start:end]: (position, length, edits), position -1 when not found """
+        if end is None:
+            end = len(text)
+        is_bytes = isinstance(text, (bytes, bytearray))
+        regex = self._byte_filter if is_bytes else self._filter
+        pieces = self._byte_pieces if is_bytes else self.pieces
+        newline = b"\n" if is_bytes else "\n"
+        size = len(self.pattern)
+        errors = self.max_errors
+
+        pos = start
+        while True:
+            candidate = regex.search(text, pos, end)
+            if candidate is None:
+                return (-1, 0, 0)
+
+            # Window holding every match that contains one of the pieces found here (the same piece can occur more
+            # than once in the pattern) at its place, within the line
+            hit = candidate.start()
+            offsets = [offset for offset, piece in zip(self._offsets, pieces) if text.startswith(piece, hit)]
+            low = max(start, hit - offsets[-1] - errors, text.rfind(newline, start, hit) + 1)
+            high = min(end, hit - offsets[0] + size + errors)
+            line_end = text.find(newline, hit, high)
+            if line_end != -1:
+                high = line_end
+
+            distance, match_end = self._best_end(text, low, high)
+            if distance <= errors:
+                match_start = self._best_start(text, low, match_end, distance)
+                return (match_start, match_end - match_start, distance)
+
+            pos = hit + 1
+
+    @staticmethod
+    def _masks(pattern: str) -> dict:
+        # Bit i is set for the characters equal to pattern[i], keyed by character and (ASCII) byte value
+        masks = {}
+        for index, char in enumerate(pattern):
+            masks[char] = masks.get(char, 0) | (1 << index)
+            if char.isascii():
+                masks[ord(char)] = masks[char]
+        return masks
+
+    def _best_end(self, text: Union[str, bytes], low: int, high: int) -> tuple[int, int]:
+        """ Fewest edits of a substring of text[low:high] and the (first) end position with that many edits """
+        size = len(self.pattern)
+        full = (1 << size) - 1
+        last = 1 << (size - 1)
+        masks = self._masks
+
+        positive, negative = full, 0
+        score = size
+        best, best_end = size + 1, low
+        for index in range(low, high):
+            eq = masks.get(text[index], 0)
+            xv = eq | negative
+            xh = (((eq & positive) + positive) ^ positive) | eq
+            hp = negative | (~(xh | positive) & full)
+            hn = positive & xh
+            if hp & last:
+                score += 1
+            elif hn & last:
+                score -= 1
+            # Start anywhere in the text: no carry into the first row
+            hp = (hp << 1) & full
+            hn = (hn << 1) & full
+            positive = hn | (~(xv | hp) & full)
+            negative = hp & xv
+
+            if score < best:
+                best, best_end = score, index + 1
+        return (best, best_end)
+
+    def _best_start(self, text: Union[str, bytes], low: int, end: int, distance: int) -> int:
+        """ Start of the shortest substring of text[low:end] ending at 'end' with 'distance' edits """
+        size = len(self.pattern)
+        full = (1 << size) - 1
+        last = 1 << (size - 1)
+        masks = self._reversed_masks
+
+        positive, negative = full, 0
+        score = size
+        for index in range(end - 1, low - 1, -1):
+            eq = masks.get(text[index], 0)
+            xv = eq | negative
+            xh = (((eq & positive) + positive) ^ positive) | eq
+            hp = negative | (~(xh | positive) & full)
+            hn = positive & xh
+            if hp & last:
+                score += 1
+            elif hn & last:
+                score -= 1
+            # Anchored at 'end': every skipped character counts as an edit
+            hp = ((hp << 1) | 1) & full
+            hn = (hn << 1) & full
+            positive = hn | (~(xv | hp) & full)
+            negative = hp & xv
+
+            if score <= distance:
+                return index
+        return low
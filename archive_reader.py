@@ -0,0 +1,131 @@
+""" Transparent access to the content of compressed files and zip archives
+
+Remarks:
+    A compressed file (.gz, .bz2, .xz) is searched under its own path. A member of a zip archive gets the path
+    'archive.zip!member' (member as stored in the archive, with '/'). Both are decompressed while they are read,
+    in chunks: the content is never held as a whole, in memory or on disk.
+
+    The mtime and size of the file on disk are used for both (e.g. by the result cache): when an archive changes,
+    all its members are searched again.
+
+    Every thread keeps its last ZIP_CACHE zip archives open: the members of an archive are listed one after the other,
+    its central directory is only read once instead of for every member.
+"""
+
+import io
+import os
+import bz2
+import gzip
+import lzma
+import zlib
+import logging
+import zipfile
+import threading
+from collections import OrderedDict
+from typing import BinaryIO, Callable, Iterator
+
+SEPARATOR = "!"
+COMPRESSED = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+ARCHIVES = (".zip",)
+ZIP_CACHE = 4   # Zip archives kept open per thread
+
+# Errors of damaged or truncated compressed data (next to OSError)
+ERRORS = (OSError, EOFError, zlib.error, lzma.LZMAError, zipfile.BadZipFile)
+
+_MEMBER_MARKER = ".zip" + SEPARATOR
+
+logger = logging.getLogger(__name__)
+
+# Per thread: archive path -> ((mtime, size), open ZipFile), the most recently used last
+_open_zips = threading.local()
+
+def is_archived(path: str) -> bool:
+    """ True when the content of 'path' has to be decompressed: a compressed file, a zip archive or a member of one """
+    lowered = path.lower()
+    return lowered.endswith(ARCHIVES) or lowered.endswith(tuple(COMPRESSED)) or _MEMBER_MARKER in lowered
+
+def split(path: str) -> tuple[str, str]:
+    """ Return (archive, member) for a member of a zip archive, (path, None) otherwise """
+    index = path.lower().find(_MEMBER_MARKER)
+    if index == -1:
+        return (path, None)
+    return (path[:index + len(ARCHIVES[0])], path[index + len(_MEMBER_MARKER):])
+
+def container(path: str) -> str:
+    """ The file on disk holding the content of 'path' """
+    return split(path)[0]
+
+def stat(path: str) -> os.stat_result:
+    return os.stat(container(path))
+
+def entries(path: str, matches: Callable[[str], bool]) -> Iterator[str]:
+    """ Yield the paths to search for an archive found on disk
+
+        A compressed file is yielded when its name without the extension (e.g. 'app.log' of 'app.log.gz') or the name
+        itself matches, a zip archive yields its members of which the name matches. Encrypted members are skipped.
+    """
+    name = os.path.basename(path)
+    root, extension = os.path.splitext(name)
+
+    if extension.lower() in COMPRESSED:
+        if matches(root) or matches(name):
+            yield path
+        return
+
+    try:
+        with zipfile.ZipFile(path) as archive:
+            infos = archive.infolist()
+    except (OSError, zipfile.BadZipFile) as e:
+        logger.debug(f"Skipped archive [{path}]: {e}")
+        return
+
+    for info in infos:
+        if info.is_dir() or not matches(info.filename.rsplit("/", 1)[-1]):
+            continue
+        if info.flag_bits & 0x1:
+            logger.debug(f"Skipped encrypted member [{path}{SEPARATOR}{info.filename}]")
+            continue
+        yield path + SEPARATOR + info.filename
+
+def open_binary(path: str, data: bytes = None) -> BinaryIO:
+    """ Open the decompressed content of 'path' for reading
+
+        'data' is the (compressed) content of a compressed file when it was already read.
+
+        Raises:
+            OSError: the file can't be opened, or the member is not (or no longer) in the archive
+    """
+    archive, member = split(path)
+
+    if member is not None:
+        try:
+            return _zip_file(archive).open(member)
+        except (zipfile.BadZipFile, KeyError, NotImplementedError) as e:
+            raise OSError(f"Can't read [{member}] in [{archive}]: {e}") from e
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in COMPRESSED:
+        raise OSError(f"Not a compressed file [{path}]")
+    return COMPRESSED[extension](io.BytesIO(data) if data is not None else path)
+
+def _zip_file(archive: str) -> zipfile.ZipFile:
+    """ The open ZipFile of 'archive' kept by the current thread, opened again when the archive changed """
+    stat = os.stat(archive)
+    identity = (stat.st_mtime_ns, stat.st_size)
+
+    zip_files = getattr(_open_zips, "archives", None)
+    if zip_files is None:
+        zip_files = _open_zips.archives = OrderedDict()
+
+    entry = zip_files.pop(archive, None)
+    if entry is not None and entry[0] != identity:
+        entry[1].close()
+        entry = None
+    if entry is None:
+        entry = (identity, zipfile.ZipFile(archive))
+    zip_files[archive] = entry
+
+    # A member that is still being read keeps the archive file open until it is closed itself
+    while len(zip_files) > ZIP_CACHE:
+        zip_files.popitem(last = False)[1][1].close()
+    return entry[1]
@@ -0,0 +1,130 @@
+""" Benchmark of the GUI insertion path (Application.on_after_elapsed)
+
+    Synthetic results are fed through the queue like the executor does, while the Tk main loop runs. Measures the total
+    time until all results are shown and the longest single tick, i.e. the longest time the GUI does not respond.
+    Needs a display.
+
+    Usage:
+        python benchmarks/bench_gui.py [--results N] [--lines N] [--repeat N] [--output bench_gui.json]
+"""
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import platform
+import threading
+import tkinter as tk
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import Application
+from process_executor import PyProcessExecutor
+from process_result import ProcessResult
+from search_stats import SearchStats
+
+class FeedExecutor(threading.Thread):
+    """ Puts prepared results on the queue, as fast as the queue accepts them
+
+    Attributes:
+        _results (list[ProcessResult])
+        _q (queue.Queue)
+        _stop_event (threading.Event)
+        stats (SearchStats): read by the GUI like the stats of an executor, only the render time is filled in
+    Args:
+        results (list[ProcessResult])
+        q (queue.Queue)
+    """
+    def __init__(self, results: list[ProcessResult], q: queue.Queue):
+        super(FeedExecutor, self).__init__(daemon = True)
+        self._results = results
+        self._q = q
+        self._stop_event = threading.Event()
+        self.stats = SearchStats()
+
+    def run(self):
+        for result in self._results + [PyProcessExecutor.SENTINEL]:
+            if self._stop_event.is_set():
+                return
+            self._q.put(result)
+
+    def stop(self):
+        self._stop_event.set()
+
+def run_once(results: list[ProcessResult]) -> dict:
+    root = tk.Tk()
+    app = Application(master = root)
+    ticks = []
+
+    # Time every tick of the original method
+    on_after_elapsed = app.on_after_elapsed
+    def timed_on_after_elapsed():
+        start = time.perf_counter()
+        on_after_elapsed()
+        ticks.append(time.perf_counter() - start)
+
+        # Search done: the Search button is enabled again
+        if app.btn_search['state'] == "normal":
+            root.quit()
+    app.on_after_elapsed = timed_on_after_elapsed
+
+    def start():
+        app.executor = FeedExecutor(results, app.q)
+        app.search_input = ("", "", "")
+        app.toggle_search()
+        app.executor.start()
+        app.after_id = root.after(Application.DELAY, app.on_after_elapsed)
+
+    begin = time.perf_counter()
+    root.after(0, start)
+    root.mainloop()
+    total = time.perf_counter() - begin
+    root.destroy()
+
+    return {
+        "results": len(results),
+        "total_seconds": round(total, 4),
+        "ticks": len(ticks),
+        "max_tick_seconds": round(max(ticks), 4),
+        "mean_tick_seconds": round(sum(ticks) / len(ticks), 4),
+        "rows_per_s": round(len(results) / total, 1),
+    }
+
+def parse_args(args: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description = "Benchmark the insertion of results into the GUI")
+    parser.add_argument("--results", type = int, default = 20000)
+    parser.add_argument("--lines", type = int, default = 3, help = "found lines per result")
+    parser.add_argument("--repeat", type = int, default = 3)
+    parser.add_argument("--output", default = "bench_gui.json")
+    return parser.parse_args(args)
+
+def main(args: list[str]):
+    args = parse_args(args)
+
+    results = [ProcessResult(f"C:/bench/d{number % 97}/f{number:06d}.md", [f"{line + 1}: some line with the needle\n" for line in range(args.lines)])
+               for number in range(args.results)]
+
+    runs = []
+    for repeat in range(args.repeat):
+        measurement = run_once(results)
+        measurement["repeat"] = repeat
+        runs.append(measurement)
+        print(f"#{repeat}: {measurement['total_seconds']} s, max tick {measurement['max_tick_seconds']} s", file = sys.stderr)
+
+    report = {
+        "benchmark": "gui",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "tk": tk.TkVersion,
+        "lines": args.lines,
+        "runs": runs,
+    }
+    with open(args.output, "w", encoding = "utf8") as writer:
+        json.dump(report, writer, indent = 2)
+
+
+# Main processing
+if __name__ == "__main__":
+	main(sys.argv[1:])
@@ -0,0 +1,145 @@
+""" Benchmark of the headless search (enumeration, throughput, time to first result, memory)
+
+    Every configuration runs in a fresh interpreter, so the peak memory of one run does not hide the next one.
+    The results are written as JSON, to compare runs use the same corpus arguments (the corpus is deterministic).
+
+    Usage:
+        python benchmarks/bench_search.py [--corpus DIR] [--files N] [--size BYTES] [--workers 1,4] [--engines mmap,line]
+                                          [--repeat N] [--output bench_search.json]
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import subprocess
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import corpus
+import search_api
+from file_walker import FileWalker
+from search_options import SearchOptions
+
+try:
+    import resource
+except ImportError:
+    resource = None     # Not available on Windows
+
+def run_once(config: dict) -> dict:
+    """ Run a single search as described by 'config' and return the measurements """
+    # Decode errors of the non UTF-8 files are expected, don't print them
+    logging.getLogger().addHandler(logging.NullHandler())
+
+    if config["tracemalloc"]:
+        tracemalloc.start()
+
+    # Enumeration only
+    start = time.perf_counter()
+    files = list(FileWalker(config["root"], config["types"], lambda: False))
+    enum_seconds = time.perf_counter() - start
+    total_bytes = sum(os.path.getsize(file) for file in files)
+
+    # Complete search
+    options = SearchOptions(workers = config["workers"], engine = config["engine"])
+    first_result = None
+    matches = 0
+    lines = 0
+
+    start = time.perf_counter()
+    for result in search_api.search(config["root"], config["types"], config["query"], options):
+        if first_result is None:
+            first_result = time.perf_counter() - start
+        matches += 1
+        lines += result.line_count
+    search_seconds = time.perf_counter() - start
+
+    measurement = dict(config)
+    measurement.update({
+        "files": len(files),
+        "bytes": total_bytes,
+        "enum_seconds": round(enum_seconds, 4),
+        "search_seconds": round(search_seconds, 4),
+        "mb_per_s": round(total_bytes / (1 << 20) / search_seconds, 2) if search_seconds else None,
+        "files_per_s": round(len(files) / search_seconds, 1) if search_seconds else None,
+        "ttfr_seconds": round(first_result, 4) if first_result is not None else None,
+        "matches": matches,
+        "lines": lines,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None,
+        "tracemalloc_peak_kb": tracemalloc.get_traced_memory()[1] // 1024 if config["tracemalloc"] else None,
+    })
+    return measurement
+
+def run_isolated(config: dict) -> dict:
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--run-one", json.dumps(config)],
+                            check = True, capture_output = True, text = True).stdout
+    return json.loads(output)
+
+def parse_args(args: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description = "Benchmark the headless search")
+    parser.add_argument("--corpus", default = "bench_corpus", help = "corpus directory, generated when missing")
+    parser.add_argument("--files", type = int, default = 2000)
+    parser.add_argument("--size", type = int, default = 64 << 10)
+    parser.add_argument("--depth", type = int, default = 3)
+    parser.add_argument("--density", type = float, default = 0.001)
+    parser.add_argument("--non-utf8", type = float, default = 0.02)
+    parser.add_argument("--seed", type = int, default = 1)
+    parser.add_argument("--workers", default = "1", help = "comma separated list of worker counts")
+    parser.add_argument("--engines", default = "mmap,line", help = "comma separated list of engines")
+    parser.add_argument("--repeat", type = int, default = 3)
+    parser.add_argument("--tracemalloc", action = "store_true", help = "also measure the peak of the Python heap (slower)")
+    parser.add_argument("--output", default = "bench_search.json")
+    parser.add_argument("--run-one", help = argparse.SUPPRESS)
+    return parser.parse_args(args)
+
+def main(args: list[str]):
+    args = parse_args(args)
+
+    if args.run_one:
+        print(json.dumps(run_once(json.loads(args.run_one))))
+        return
+
+    # Generate the corpus once, its parameters are stored next to it
+    info_file = os.path.join(args.corpus, "corpus.json")
+    params = {"files": args.files, "size": args.size, "depth": args.depth, "density": args.density, "non_utf8": args.non_utf8, "seed": args.seed}
+    info = None
+    if os.path.exists(info_file):
+        with open(info_file, "r", encoding = "utf8") as reader:
+            info = json.load(reader)
+        if any(info.get(key) != value for key, value in params.items()):
+            sys.exit(f"Corpus [{args.corpus}] was generated with other parameters, remove it or use another --corpus")
+    else:
+        info = corpus.generate(args.corpus, **params)
+        with open(info_file, "w", encoding = "utf8") as writer:
+            json.dump(info, writer, indent = 2)
+
+    runs = []
+    for engine in args.engines.split(","):
+        for workers in args.workers.split(","):
+            for repeat in range(args.repeat):
+                config = {"root": args.corpus, "types": "*.md", "query": corpus.TERM, "engine": engine,
+                          "workers": int(workers), "repeat": repeat, "tracemalloc": args.tracemalloc}
+                measurement = run_isolated(config)
+                runs.append(measurement)
+                print(f"{engine:5} workers={workers:>2} #{repeat}: {measurement['mb_per_s']} MB/s, "
+                      f"{measurement['files_per_s']} files/s, ttfr {measurement['ttfr_seconds']} s", file = sys.stderr)
+
+    report = {
+        "benchmark": "search",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "corpus": info,
+        "runs": runs,
+    }
+    with open(args.output, "w", encoding = "utf8") as writer:
+        json.dump(report, writer, indent = 2)
+
+
+# Main processing
+if __name__ == "__main__":
+	main(sys.argv[1:])
@@ -0,0 +1,87 @@
+""" Deterministic synthetic corpus for the benchmarks
+
+    Usage:
+        python benchmarks/corpus.py <root> [--files N] [--size BYTES] [--depth N] [--density F] [--non-utf8 F] [--seed N]
+"""
+import os
+import sys
+import json
+import random
+import argparse
+
+WORDS = ("alpha beta gamma delta epsilon connection server client request response error warning info debug "
+         "cache index thread queue result search file path line value config").split()
+TERM = "needle"             # Text which is spread over the corpus with the given density
+WIDTH = 8                   # Sub directories per directory level
+
+def generate(root: str, files: int = 1000, size: int = 64 << 10, depth: int = 3, density: float = 0.001,
+             non_utf8: float = 0.02, seed: int = 1, file_type: str = ".md") -> dict:
+    """ Create the corpus below 'root', the same arguments always give the same files
+
+        Args:
+            root (str): directory to create the files in
+            files (int): number of files
+            size (int): average file size in bytes (sizes vary between 0.5x and 1.5x)
+            depth (int): number of directory levels
+            density (float): fraction of the lines containing TERM
+            non_utf8 (float): fraction of the files containing an invalid UTF-8 byte sequence
+            seed (int)
+            file_type (str): extension of the generated files
+        Returns the parameters and the totals of the corpus.
+    """
+    rnd = random.Random(seed)
+    total_bytes = 0
+    total_hits = 0
+
+    for number in range(files):
+        # Spread the files over the directory levels
+        parts = []
+        rest = number
+        for _ in range(depth):
+            parts.append(f"d{rest % WIDTH}")
+            rest //= WIDTH
+        directory = os.path.join(root, *parts)
+        os.makedirs(directory, exist_ok = True)
+
+        target = int(size * (0.5 + rnd.random()))
+
+        lines = []
+        written = 0
+        while written < target:
+            line = " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(4, 14)))
+            if rnd.random() < density:
+                line += " " + TERM.capitalize()
+                total_hits += 1
+            data = (line + "\n").encode("utf8")
+            lines.append(data)
+            written += len(data)
+
+        if lines and rnd.random() < non_utf8:
+            bad_line = rnd.randrange(len(lines))
+            lines[bad_line] = b"\xff\xfe " + lines[bad_line]
+            written += 3
+
+        with open(os.path.join(directory, f"f{number:06d}{file_type}"), "wb") as writer:
+            writer.write(b"".join(lines))
+        total_bytes += written
+
+    return {"root": root, "files": files, "size": size, "depth": depth, "density": density, "non_utf8": non_utf8,
+            "seed": seed, "term": TERM, "total_bytes": total_bytes, "total_hits": total_hits}
+
+def parse_args(args: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description = "Generate a deterministic synthetic corpus")
+    parser.add_argument("root")
+    parser.add_argument("--files", type = int, default = 1000)
+    parser.add_argument("--size", type = int, default = 64 << 10)
+    parser.add_argument("--depth", type = int, default = 3)
+    parser.add_argument("--density", type = float, default = 0.001)
+    parser.add_argument("--non-utf8", type = float, default = 0.02)
+    parser.add_argument("--seed", type = int, default = 1)
+    return parser.parse_args(args)
+
+
+# Main processing
+if __name__ == "__main__":
+	args = parse_args(sys.argv[1:])
+	info = generate(args.root, args.files, args.size, args.depth, args.density, args.non_utf8, args.seed)
+	print(json.dumps(info, indent = 2))
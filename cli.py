@@ -0,0 +1,103 @@
+import os
+import re
+import sys
+import json
+import logging
+import argparse
+
+import search_api
+from query import Query
+from search_options import SearchOptions
+from search_stats import SearchStats
+
+def parse_args(args: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description = "ftsSearch - Search for text in files, matches are written to stdout as JSON lines")
+    parser.add_argument("-r", "--root", required = True, help = "directory to search in (recursively)")
+    parser.add_argument("-t", "--types", default = "*.md", help = "comma separated file types (default: %(default)s)")
+    parser.add_argument("-q", "--query", required = True, help = "text to search for, case insensitive")
+    parser.add_argument("-m", "--mode", choices = Query.MODES, default = "text",
+                        help = "text: QUERY as a whole, any / all: whitespace separated terms, regex: regular expression, fuzzy: QUERY with typos (default: %(default)s)")
+    parser.add_argument("-e", "--max-errors", type = int, choices = [1, 2], default = 1,
+                        help = "mode fuzzy: max. number of edits (insertions, deletions, substitutions) in a hit (default: %(default)s)")
+    parser.add_argument("-w", "--workers", type = int, default = 1, help = "number of worker processes, 0 = all cores (default: %(default)s)")
+    parser.add_argument("--read-ahead", type = int, default = 0, metavar = "THREADS",
+                        help = "read upcoming files in advance with THREADS threads, for slow or network filesystems (default: off)")
+    parser.add_argument("--max-matches", type = int, default = 0, metavar = "N", help = "stop after N matching files (default: no limit)")
+    parser.add_argument("--max-lines", type = int, default = 0, metavar = "N", help = "keep at most N found lines per file (default: no limit)")
+    parser.add_argument("--max-seconds", type = float, default = 0, metavar = "S", help = "stop the search after S seconds (default: no limit)")
+    parser.add_argument("-z", "--archives", action = "store_true",
+                        help = "also search inside .gz, .bz2 and .xz files and zip archives (matches in members are reported as ARCHIVE!MEMBER)")
+    parser.add_argument("-x", "--exclude", default = "", metavar = "PATTERNS",
+                        help = "comma separated gitignore style patterns of files and directories ('name/') to skip")
+    parser.add_argument("--gitignore", action = "store_true", help = "also skip what the .gitignore files in the tree exclude")
+    parser.add_argument("--max-size", type = float, default = 0, metavar = "MB", help = "skip files larger than MB megabytes (default: no limit)")
+    parser.add_argument("--skip-binary", action = "store_true", help = "skip files with binary content (a NUL byte in the first 8000 bytes)")
+    parser.add_argument("--dedup", action = "store_true",
+                        help = "search a file once when several paths point to it (hard links, symlinks), its matches are output for every path")
+    parser.add_argument("--dedup-content", action = "store_true", help = "like --dedup, also for files with identical content (copies)")
+    parser.add_argument("--top", type = int, default = 0, metavar = "N",
+                        help = "ranked: only output the N most relevant matching files, best first, when the search ends (default: off)")
+    parser.add_argument("--daemon", action = "store_true", help = "let the search daemon search when it is running (see search_daemon.py)")
+    parser.add_argument("--index", action = "store_true", help = "use (and update) the persistent trigram index of the root")
+    parser.add_argument("--engine", choices = ["mmap", "line"], default = "mmap", help = "search engine (default: %(default)s)")
+    parser.add_argument("--stats", action = "store_true", help = "write timings per phase and counters to stderr")
+    parser.add_argument("--profile", metavar = "FILE", default = "", help = "run the search under cProfile, dump the stats to FILE")
+    args = parser.parse_args(args)
+
+    try:
+        Query.compile(args.query, args.mode, args.max_errors)
+    except (re.error, ValueError) as e:
+        parser.error(f"invalid query: {e}")
+
+    return args
+
+def main(args: list[str]) -> int:
+    """ Returns 0 when matches were found, 1 when not, 2 when the search failed (like grep) """
+    args = parse_args(args)
+
+    # Errors of the search go to stderr, stdout only holds results
+    logging.basicConfig(stream = sys.stderr, format = '%(asctime)s %(levelname)-8s %(message)s', datefmt = '%Y-%m-%d %H:%M:%S', level = logging.WARNING)
+
+    options = SearchOptions(use_index = args.index, workers = args.workers, engine = args.engine, profile = args.profile,
+                            mode = args.mode, max_errors = args.max_errors, read_ahead = args.read_ahead, max_matches = args.max_matches, max_lines = args.max_lines,
+                            max_seconds = args.max_seconds, archives = args.archives,
+                            exclude = args.exclude, gitignore = args.gitignore, max_size = int(args.max_size * (1 << 20)),
+                            skip_binary = args.skip_binary, dedup = args.dedup, dedup_content = args.dedup_content, top_k = args.top)
+    stats = SearchStats()
+
+    matches = 0
+    try:
+        for result in search_api.search(args.root, args.types, args.query, options, stats = stats, daemon = args.daemon):
+            output = {"key": result.key, "dat": result.dat}
+            if result.terms is not None:
+                output["terms"] = list(result.terms)
+            if result.distance is not None:
+                output["distance"] = result.distance
+            if result.truncated:
+                output["truncated"] = True
+            if args.top:
+                output["score"] = round(result.score, 3)
+            sys.stdout.write(json.dumps(output) + "\n")
+            sys.stdout.flush()
+            matches += 1
+    except BrokenPipeError:
+        # Reader of the output stopped (e.g. 'head'), stop searching as well. Python flushes stdout at exit,
+        # so point it to devnull to avoid another BrokenPipeError
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+    except RuntimeError as e:
+        # The details are logged by the executor
+        sys.stderr.write(f"search failed: {e}\n")
+        return 2
+
+    if args.stats:
+        sys.stderr.write(f"matches: {matches}, {stats.summary()}\n")
+    elif stats.truncated:
+        sys.stderr.write(f"search truncated: {stats.truncated}\n")
+
+    return 0 if matches > 0 else 1
+
+
+# Main processing
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
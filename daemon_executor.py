@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import queue
+import socket
+import logging
+import threading
+import dataclasses
+
+from process_executor import PyProcessExecutor
+from process_result import ProcessResult
+from result_cache import ResultCache
+from search_options import SearchOptions
+from search_stats import SearchStats
+
+HOST = "127.0.0.1"
+# Port and token of the daemon of the user, only readable by that user
+ENDPOINT_FILE = os.path.join(os.path.expanduser("~"), ".fts_search", "daemon.json")
+
+def read_endpoint(path: str = ENDPOINT_FILE) -> tuple[int, str]:
+    """ (port, token) written by the running daemon, None when there is none """
+    try:
+        with open(path, "r", encoding = "utf8") as reader:
+            endpoint = json.load(reader)
+        return (int(endpoint["port"]), str(endpoint["token"]))
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def write_endpoint(port: int, token: str, path: str = ENDPOINT_FILE):
+    """ Publish the port and token of the daemon for the clients of the same user (file mode 0600) """
+    os.makedirs(os.path.dirname(path), mode = 0o700, exist_ok = True)
+
+    # Created with its permissions (not changed afterwards), replaced as a whole
+    temp = f"{path}.{os.getpid()}.tmp"
+    descriptor = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descriptor, "w", encoding = "utf8") as writer:
+        json.dump({"port": port, "token": token}, writer)
+    os.replace(temp, path)
+
+def remove_endpoint(token: str, path: str = ENDPOINT_FILE):
+    """ Remove the endpoint file, unless another daemon has replaced it since """
+    endpoint = read_endpoint(path)
+    if endpoint is not None and endpoint[1] == token:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+class PyDaemonExecutor(threading.Thread):
+    """ Let the search daemon (see search_daemon.py) execute the search, in a separate Thread
+
+    Remarks:
+        Uses the same protocol as PyProcessExecutor: results are put on the queue, followed by the SENTINEL. The daemon
+        streams the results as JSON lines (ProcessResult.to_dict), compact results stay compact: the daemon runs on the
+        same host, the lines are read from the files when shown.
+
+        Every user runs a daemon of their own: it listens on a free port and writes the port and a random token to
+        ENDPOINT_FILE in the home directory of the user. The token is sent with every request, the daemon rejects
+        requests without it, so other users on the host can't search (or read) files through it.
+
+        Use 'connect' to create the executor: it returns None when no daemon is running, the caller then falls back to
+        PyProcessExecutor. After a failed attempt no connection is tried for RETRY_INTERVAL seconds.
+
+        When the daemon fails before it sent a result (e.g. it rejects the token of a daemon that was restarted), the
+        executor runs the search in this process itself (PyProcessExecutor.run, in the thread of this executor).
+
+    Attributes:
+        _sock (socket.socket): connection to the daemon
+        _token (str): proves the client runs as the user of the daemon
+        _input (tuple[str,str,str])
+        _options (SearchOptions)
+        _cache (ResultCache): used when searching in this process, can be None
+        _q (queue.Queue): Object to share 'Thread-safe' data between threads
+        _stop_event (threading.Event): used to indicate thread should be stopped
+        _local (PyProcessExecutor): the search in this process after the daemon failed, None before
+        stats (SearchStats): timings and counters of the search, as reported by the daemon
+        logger (Logger)
+    Args:
+        sock (socket.socket)
+        token (str)
+        input (tuple[str,str,str])
+        q (queue.Queue)
+        options (SearchOptions)
+        cache (ResultCache)
+    """
+
+    CONNECT_TIMEOUT = 0.5
+    RETRY_INTERVAL = 30.0
+    _unavailable_until = 0.0
+
+    def __init__(self, sock: socket.socket, token: str, input: tuple[str,str,str], q: queue.Queue, options: SearchOptions = None,
+                 cache: ResultCache = None):
+        super(PyDaemonExecutor, self).__init__(daemon = True)
+
+        self._sock = sock
+        self._token = token
+        self._input = input
+        self._options = options if options is not None else SearchOptions()
+        self._cache = cache
+
+        self._q = q
+        self._stop_event = threading.Event()
+        self._local = None
+        self.stats = SearchStats()
+
+        # Logging config
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def connect(cls, input: tuple[str,str,str], q: queue.Queue, options: SearchOptions = None, cache: ResultCache = None,
+                endpoint_file: str = ENDPOINT_FILE) -> "PyDaemonExecutor":
+        """ Return an executor connected to the daemon of the user, None when no daemon is available """
+        if time.monotonic() < cls._unavailable_until:
+            return None
+
+        # No endpoint: the daemon is not running (the endpoint of a daemon that died fails to connect)
+        endpoint = read_endpoint(endpoint_file)
+        sock = None
+        if endpoint is not None:
+            try:
+                sock = socket.create_connection((HOST, endpoint[0]), timeout = cls.CONNECT_TIMEOUT)
+            except OSError:
+                pass
+
+        if sock is None:
+            cls._unavailable_until = time.monotonic() + cls.RETRY_INTERVAL
+            return None
+
+        # A search can take a while before the next result comes in
+        sock.settimeout(None)
+        return cls(sock, endpoint[1], input, q, options, cache)
+
+    def run(self):
+        request = {"token": self._token, "path": self._input[0], "file_types": self._input[1], "text": self._input[2],
+                   "options": dataclasses.asdict(self._options)}
+        received = False
+
+        try:
+            self._sock.sendall((json.dumps(request) + "\n").encode("utf8"))
+
+            with self._sock.makefile("r", encoding = "utf8") as reader:
+                for line in reader:
+                    if self.stopped(): # Handle STOP
+                        return
+
+                    message = json.loads(line)
+                    if "error" in message:
+                        self.logger.error(f"Search daemon: {message['error']}")
+                        break
+
+                    if message.get("end"):
+                        stats = SearchStats.from_dict(message["stats"])
+                        self.stats.merge(stats)
+                        self.stats.wall = stats.wall
+                        self.logger.info(f"Search for [{self._input[2]}] in [{self._input[0]}] (daemon): {self.stats.summary()}")
+
+                        # Indicate end of result
+                        self._put(PyProcessExecutor.SENTINEL)
+                        return
+
+                    self._put(ProcessResult.from_dict(message))
+                    received = True
+        except (OSError, ValueError) as e:
+            if not self.stopped():
+                self.logger.error(f"Connection to the search daemon lost: {e}")
+        finally:
+            self._sock.close()
+
+        # Results already put on the queue can't be taken back: only a search without results is done again
+        if not received and not self.stopped():
+            self._search_locally()
+
+    def _search_locally(self):
+        self.logger.info(f"Search for [{self._input[2]}] in [{self._input[0]}] without the daemon")
+        type(self)._unavailable_until = time.monotonic() + PyDaemonExecutor.RETRY_INTERVAL
+
+        # The stats of this executor are the ones read by the caller
+        self._local = PyProcessExecutor(self._input, self._q, self._options, self._cache)
+        self._local.stats = self.stats
+        if self.stopped(): # Handle STOP (set before '_local' was)
+            return
+        self._local.run()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._local is not None:
+            self._local.stop()
+
+        # Closing the connection stops the search in the daemon, and wakes up 'run'
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def stopped(self):
+        return self._stop_event.is_set()
+
+    def _put(self, result: ProcessResult):
+        # The queue can be bounded: wait for free space, but keep checking for STOP
+        while not self.stopped():
+            try:
+                self._q.put(result, timeout = PyProcessExecutor.POLL_INTERVAL)
+                return
+            except queue.Full:
+                pass
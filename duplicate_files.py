@@ -0,0 +1,151 @@
+import os
+import hashlib
+import logging
+import threading
+from typing import Iterable, Iterator
+
+import archive_reader
+from process_result import ProcessResult
+
+class DuplicateFiles:
+    """ Collapses the paths of the same file (hard links, symlinks) and optionally of identical copies
+
+    Remarks:
+        'add' (or 'unique' for a list) registers the paths: the first path of every file is searched, the later paths of
+        the same file become its aliases. The search only reads the first path, its result is handed out for the aliases
+        ('searched', 'take_ready'), so every alias is reported as if it had been searched itself.
+
+        Identity of a file:
+            - (device, inode) of the file a path points to: given by the caller (FileWalker takes it from the directory
+              listing), otherwise one stat per path
+            - with 'by_content' also a hash of the content. Only files of which the size occurs more than once are read
+              (both, once): a file of a unique size can't have a copy.
+
+        Members of zip archives are never collapsed, they have no identity of their own.
+
+        Paths are added by one thread (the FileWalker thread, or the executor for a listing) while results come from
+        the executor ('searched'): aliases found after their file was searched are kept until the executor takes them.
+
+    Attributes:
+        by_content (bool): also collapse files with the same content
+        count (int): number of paths collapsed into another
+        _identities (dict[tuple, str]): first path per (device, inode)
+        _contents (dict[tuple, str]): by_content: first path per (size, hash of the content)
+        _sizes (dict[int, str]): by_content: first path per file size, None when its content was hashed
+        _aliases (dict[str, list[str]]): aliases of first paths which were not searched yet
+        _outcomes (dict[str, ProcessResult]): result (None for no match) of every first path searched
+        _ready (list[tuple[str, ProcessResult]]): aliases of which the result is known, with that result
+        _lock (threading.Lock): protects the aliases, the outcomes and the ready list
+        logger (Logger)
+    Args:
+        by_content (bool)
+    """
+
+    HASH_BLOCK = 1 << 20
+
+    def __init__(self, by_content: bool = False):
+        self.by_content = by_content
+        self.count = 0
+        self._identities = {}
+        self._contents = {}
+        self._sizes = {}
+        self._aliases = {}
+        self._outcomes = {}
+        self._ready = []
+        self._lock = threading.Lock()
+
+        # Logging config
+        self.logger = logging.getLogger(__name__)
+
+    def unique(self, files: Iterable[str]) -> Iterator[str]:
+        """ Yield the files of which no other path was seen before (one stat per file, in the iterating thread) """
+        for file in files:
+            if self.add(file):
+                yield file
+
+    def add(self, file: str, identity: tuple[int, int] = None) -> bool:
+        """ Register a path, True when it has to be searched (no other path of the file was seen before)
+
+            Args:
+                file (str)
+                identity (tuple[int, int]): (device, inode) of the file when known, a stat is saved
+        """
+        first = self._first(file, identity)
+        if first is None:
+            return True
+
+        self.count += 1
+        self.logger.debug(f"[{file}] is the same file as [{first}]")
+        with self._lock:
+            if first in self._outcomes:
+                self._ready.append((file, self._outcomes[first]))
+            else:
+                self._aliases.setdefault(first, []).append(file)
+        return False
+
+    def searched(self, file: str, result: ProcessResult):
+        """ The result of a path to search ('add' was True, None when it did not match) """
+        with self._lock:
+            self._outcomes[file] = result
+            for alias in self._aliases.pop(file, ()):
+                self._ready.append((alias, result))
+
+    def take_ready(self) -> list[tuple[str, ProcessResult]]:
+        """ (alias, result of its file) of the aliases found and searched since the previous call """
+        with self._lock:
+            ready, self._ready = self._ready, []
+        return ready
+
+    def _first(self, file: str, identity: tuple[int, int] = None) -> str:
+        """ The first path seen of the same file, None when 'file' is the first """
+        if archive_reader.split(file)[1] is not None:
+            return None
+
+        if identity is None or self.by_content:
+            try:
+                stat = os.stat(file)
+            except OSError:
+                return None # Reported when it is searched
+            if identity is None:
+                identity = (stat.st_dev, stat.st_ino)
+
+        # Some filesystems have no inode numbers (0)
+        if identity[1]:
+            first = self._identities.setdefault(identity, file)
+            if first != file:
+                return first
+
+        if not self.by_content:
+            return None
+
+        # The first file of a size is only hashed when a second one shows up
+        size = stat.st_size
+        first = self._sizes.setdefault(size, file)
+        if first == file:
+            return None
+        if first is not None:
+            self._sizes[size] = None
+            self._register_content(first, size)
+
+        first = self._register_content(file, size)
+        # Later links to this file are aliases of the copy that is searched
+        if first is not None and identity[1]:
+            self._identities[identity] = first
+        return first
+
+    def _register_content(self, file: str, size: int) -> str:
+        try:
+            digest = self._digest(file)
+        except OSError:
+            return None
+
+        first = self._contents.setdefault((size, digest), file)
+        return first if first != file else None
+
+    @staticmethod
+    def _digest(file: str) -> bytes:
+        hasher = hashlib.blake2b(digest_size = 16)
+        with open(file, "rb") as reader:
+            while block := reader.read(DuplicateFiles.HASH_BLOCK):
+                hasher.update(block)
+        return hasher.digest()
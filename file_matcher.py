@@ -0,0 +1,409 @@
+import io
+import os
+import mmap
+import time
+import logging
+from array import array
+from typing import BinaryIO, Callable, Iterator
+
+import archive_reader
+import ranking
+from process_result import ProcessResult
+from query import Query
+from search_options import SearchOptions
+from search_stats import SearchStats
+
+BLOCK_SIZE = 16 << 20       # Bytes lowercased and searched at once by the 'mmap' engine
+MMAP_THRESHOLD = 1 << 16    # Smaller files are read at once instead of memory mapped
+MAX_SPANS = 10000           # Match spans recorded per file (for highlighting the preview), the rest is not highlighted
+CHECK_LINES = 4096          # Line engine: lines between 2 checks for STOP
+CHECK_HITS = 1024           # Byte engine: hits between 2 checks for STOP (next to one check per block)
+SNIFF_BYTES = 8000          # Bytes at the start of a file checked for binary content (like git)
+
+BINARY = object()           # Returned by the engines for a file skipped because of binary content
+
+def search_file(file: str, search_param: str, options: SearchOptions, logger: logging.Logger, stats: SearchStats = None,
+                data: bytes = None, stat: os.stat_result = None, stopped: Callable[[], bool] = None) -> ProcessResult:
+    """ Search a single file for 'search_param' (case insensitive), interpreted according to 'options.mode'
+
+        Module level function, so it can be executed both in the executor thread and in a worker process.
+        Returns None when neither the path nor the content contains the search pattern.
+
+        'data' and 'stat' can be given when the file was already read (read ahead), the file is not opened again then.
+
+        'stopped' is checked per block and every CHECK_HITS hits (byte engine) or every CHECK_LINES lines (line engine): when it returns True,
+        the lines found so far are returned as a truncated result. At most 'options.max_lines' found lines are kept.
+
+        With 'options.archives', compressed files and members of zip archives ('archive.zip!member') are decompressed
+        while they are read and searched by the line engine ('data' then holds the compressed content).
+
+        With 'options.skip_binary', a file with a NUL byte in its first SNIFF_BYTES is skipped before anything is decoded
+        (UTF-16 text has those too, it can't be decoded as UTF-8 either).
+
+        Every result gets its score (see ranking.score), so results can be ranked whatever executor searched them.
+    """
+    if stats is None:
+        stats = SearchStats()
+    stats.files += 1
+    # Size of the file, as counted by the engine that searched it
+    start_bytes = stats.bytes
+
+    query = Query.compile(search_param, options.mode, options.max_errors)
+
+    # If the specified filepath contains the search pattern, add it to the results
+    path_found = query.in_path(file)
+    terms = set()
+    archived = options.archives and archive_reader.is_archived(file)
+
+    # Byte engine: compact result, the text of the lines is only read again when shown (not possible for archives)
+    if options.engine == "mmap" and query.bytes_supported() and not archived:
+        found = _search_bytes(file, query, logger, stats, terms, data, options.max_lines, stopped, options.skip_binary)
+        if found is BINARY:
+            stats.binary_files += 1
+            return None
+        if found is not None:
+            linenumbers, offsets, spans, truncated = found
+            if not query.accepts(terms):
+                linenumbers, offsets, spans = array("I"), array("Q"), array("I")
+
+            if path_found or len(linenumbers) > 0:
+                stats.matches += 1
+                stats.lines += len(linenumbers)
+                stats.truncated_files += truncated
+                result = ProcessResult.compact(file, path_found, linenumbers, offsets, _mtime(file, stat), spans)
+                result.terms = _reported_terms(query, terms)
+                result.distance = _distance(query, terms)
+                result.truncated = truncated
+                result.score = ranking.score(result, query, stats.bytes - start_bytes)
+                return result
+            return None
+        terms.clear()
+
+    # Line engine: also used when the byte engine can't give the same result
+    found_text = [ProcessResult.PATH_FOUND] if path_found else []
+
+    spans = array("I")
+    with stats.phase("decode"):
+        found = _search_lines(file, query, logger, stats, spans, terms, data, options.max_lines, stopped, archived, options.skip_binary)
+    if found is BINARY:
+        stats.binary_files += 1
+        return None
+
+    found_lines, truncated = found
+    if not query.accepts(terms):
+        found_lines, spans = [], array("I")
+
+    found_text.extend(found_lines)
+
+    # Only return result if the file contains the search pattern in the text or filename
+    if len(found_text) > 0:
+        stats.matches += 1
+        stats.lines += len(found_lines)
+        stats.truncated_files += truncated
+        result = ProcessResult(file, found_text)
+        result.path_found = path_found
+        result.mtime = _mtime(file, stat)
+        result.spans = spans
+        result.terms = _reported_terms(query, terms)
+        result.distance = _distance(query, terms)
+        result.truncated = truncated
+        result.score = ranking.score(result, query, stats.bytes - start_bytes)
+        return result
+    else:
+        return None
+
+def line_spans(line: str, query: Query, index: int, spans: array, terms: set[int]) -> bool:
+    """ Search 'line' (case insensitive), add the spans of all hits as found line 'index' and the found terms to 'terms'
+
+        Returns True when the line contains a hit. No spans are added when 'spans' is None.
+    """
+    lowered = line.lower()
+    hit, length, term = query.find(lowered, 0)
+    if hit == -1:
+        return False
+
+    # Columns count characters of the line: a few characters lowercase to more than one (U+0130), map those back
+    columns = _columns(line) if len(lowered) != len(line) else None
+    while hit != -1:
+        terms.add(term)
+        if spans is not None and len(spans) < MAX_SPANS * 3:
+            if columns is None:
+                spans.extend((index, hit, length))
+            else:
+                spans.extend((index, columns[hit], columns[hit + length] - columns[hit]))
+        elif len(query.terms) == 1:
+            break
+        hit, length, term = query.find(lowered, hit + (length or 1))
+    return True
+
+def _columns(line: str) -> list[int]:
+    # Column in 'line' of every position in its lowercased text (and of its end)
+    columns = []
+    for column, char in enumerate(line):
+        columns.extend([column] * len(char.lower()))
+    columns.append(len(line))
+    return columns
+
+def _mtime(file: str, stat: os.stat_result) -> float:
+    return stat.st_mtime if stat is not None else archive_reader.stat(file).st_mtime
+
+def _reported_terms(query: Query, terms: set[int]) -> tuple[str]:
+    # Only worth reporting when there is a choice
+    if len(query.terms) < 2:
+        return None
+    return query.matched_terms(terms)
+
+def _distance(query: Query, terms: set[int]) -> int:
+    # Fuzzy: the 'terms' of the hits are their number of edits
+    if query.matcher is None or len(terms) == 0:
+        return None
+    return min(terms)
+
+def _search_lines(file: str, query: Query, logger: logging.Logger, stats: SearchStats, spans: array, terms: set[int],
+                  data: bytes = None, limit: int = 0, stopped: Callable[[], bool] = None, archived: bool = False,
+                  sniff: bool = False) -> tuple[list[str], bool]:
+    found_text = []
+    truncated = False
+
+    linenumber = 0
+    # Content read in advance is read the same way: bytes split into lines (universal newlines), decoded per line
+    if archived:
+        # Decompressed in chunks while reading, counted as the decompressed size
+        raw = archive_reader.open_binary(file, data)
+    elif data is not None:
+        raw = io.BytesIO(data)
+        stats.bytes += len(data)
+    else:
+        raw = open(file, "rb")
+        stats.bytes += os.fstat(raw.fileno()).st_size
+
+    with raw:
+        try:
+            # The first block is read into the buffer anyway
+            binary = sniff and is_binary(data if data is not None and not archived else raw.peek(SNIFF_BYTES))
+        except archive_reader.ERRORS as e:
+            if not archived:
+                raise
+
+            # Damaged right after its header: nothing to search
+            logger.error(f"Error while reading file [{file}]: {e}")
+            return (found_text, True)
+        if binary:
+            return BINARY
+
+        lines = _lines(raw)
+        while True:
+            try:
+                raw_line = next(lines, None)
+            except archive_reader.ERRORS as e:
+                if not archived:
+                    raise
+
+                # Damaged or truncated archive: keep the lines found so far
+                logger.error(f"Error while reading file [{file}]: {e}")
+                truncated = True
+                break
+
+            if raw_line is None:
+                break
+            linenumber += 1
+
+            if stopped is not None and linenumber % CHECK_LINES == 0 and stopped(): # Handle STOP
+                truncated = True
+                break
+
+            try:
+                line = raw_line.decode("utf8")
+            except UnicodeDecodeError as e:
+                # Like the byte engine: only this line is skipped, logged when it contains a hit
+                if line_spans(raw_line.decode("utf8", errors = "replace"), query, 0, None, set()):
+                    logger.error(f"Error while reading file [{file}]: {e}")
+                    stats.decode_errors += 1
+                continue
+
+            if limit and len(found_text) >= limit:
+                # Limit reached: 'all' still has to find the missing terms, the lines are not kept
+                if line_spans(line, query, 0, None, terms):
+                    truncated = True
+                    if query.accepts(terms):
+                        break
+            # Ignore case
+            elif line_spans(line, query, len(found_text), spans, terms):
+                found_text.append(str(linenumber) + ": " + line)
+
+        if archived:
+            stats.bytes += raw.tell()
+
+    return (found_text, truncated)
+
+def _lines(raw: BinaryIO) -> Iterator[bytes]:
+    """ Yield the lines of a binary stream with universal newlines (LF, CRLF and a single CR end a line), ending with LF """
+    for line in raw:
+        if line.endswith(b"\r\n"):
+            line = line[:-2] + b"\n"
+        if b"\r" not in line:
+            yield line
+            continue
+
+        # Lines ending with a single '\r' (only '\n' ends a line read from the stream)
+        parts = line.split(b"\r")
+        for part in parts[:-1]:
+            yield part + b"\n"
+        if parts[-1]:
+            yield parts[-1]
+
+def _search_bytes(file: str, query: Query, logger: logging.Logger, stats: SearchStats, terms: set[int],
+                  data: bytes = None, limit: int = 0, stopped: Callable[[], bool] = None, sniff: bool = False) -> tuple[array, array, array, bool]:
+    """ Search the raw bytes of a file, returns the line numbers and byte offsets of the lines containing a hit, the match spans
+        and whether the result is truncated
+
+        The file is memory mapped (or read at once when small) and searched per block of BLOCK_SIZE, each block is
+        lowercased as a whole. This only folds ASCII, so the query has to be ASCII.
+
+        Returns None when the file contains line endings the line engine would treat differently (a single '\\r') or
+        characters it lowercases differently (see Query.unfolded), BINARY when 'sniff' finds binary content.
+    """
+    if data is not None:
+        stats.bytes += len(data)
+        found = _search_buffer(file, data, query, logger, stats, terms, limit, stopped, sniff)
+        if found is None:
+            stats.bytes -= len(data)
+        return found
+
+    # Pages of a memory mapped file are only read while searching: that time is booked as 'match'
+    start = time.perf_counter()
+    with open(file, "rb") as reader:
+        size = os.fstat(reader.fileno()).st_size
+        stats.bytes += size
+
+        if size < MMAP_THRESHOLD:
+            data = reader.read()
+            stats.timings["io"] += time.perf_counter() - start
+            found = _search_buffer(file, data, query, logger, stats, terms, limit, stopped, sniff)
+        else:
+            with mmap.mmap(reader.fileno(), 0, access = mmap.ACCESS_READ) as data:
+                stats.timings["io"] += time.perf_counter() - start
+                found = _search_buffer(file, data, query, logger, stats, terms, limit, stopped, sniff)
+
+    # Counted again by the line engine
+    if found is None:
+        stats.bytes -= size
+
+    return found
+
+def _search_buffer(file: str, data: bytes, query: Query, logger: logging.Logger, stats: SearchStats, terms: set[int],
+                   limit: int, stopped: Callable[[], bool], sniff: bool) -> tuple[array, array, array, bool]:
+    if sniff and is_binary(data):
+        return BINARY
+    # Before anything is reported: the line engine searches the file from the start
+    if query.unfolded(data):
+        return None
+
+    linenumbers = array("I")
+    offsets = array("Q")
+    spans = array("I")
+    size = len(data)
+    checked = False     # Line endings are only checked once there is a hit, most files don't have any
+    truncated = False
+    finished = False    # Limit reached and nothing left to look for
+    hits = 0
+
+    start = 0
+    linenumber = 1      # Line number at the start of the current block
+    while start < size and not finished:
+        if stopped is not None and stopped(): # Handle STOP
+            truncated = True
+            break
+
+        # Blocks always end after a newline, so a line is never split over 2 blocks
+        end = size
+        if start + BLOCK_SIZE < size:
+            end = data.rfind(b"\n", start, start + BLOCK_SIZE) + 1 or data.find(b"\n", start + BLOCK_SIZE) + 1 or size
+
+        match_start = time.perf_counter()
+        block = data[start:end]
+        lowered = block.lower()
+
+        counted = 0
+        find = query.block_finder(lowered)
+        pos, length, term = find(0) if find is not None else (-1, 0, 0)
+        stats.timings["match"] += time.perf_counter() - match_start
+        while pos != -1:
+            hits += 1
+            if stopped is not None and hits % CHECK_HITS == 0 and stopped(): # Handle STOP
+                truncated = finished = True
+                break
+
+            # Universal newlines: a single '\r' is a line ending as well, leave those files to the line engine
+            if not checked:
+                if _has_single_cr(data):
+                    return None
+                checked = True
+
+            line_start = block.rfind(b"\n", 0, pos) + 1
+            line_end = block.find(b"\n", pos) + 1 or len(block)
+
+            linenumber += block.count(b"\n", counted, line_start)
+            counted = line_start
+
+            # Limit reached: 'all' still has to find the missing terms, the lines are not kept
+            full = limit > 0 and len(linenumbers) >= limit
+
+            # Only decoded to skip undecodable lines, like the line engine does: those don't count for the limit either
+            try:
+                with stats.phase("decode"):
+                    block[line_start:line_end].decode("utf8")
+                    _byte_spans(block, find, len(query.terms), line_start, line_end, (pos, length, term), len(linenumbers),
+                                None if full else spans, terms)
+            except UnicodeDecodeError as e:
+                # Log error for current file, but continue with the rest
+                logger.error(f"Error while reading file [{file}]: {e}")
+                stats.decode_errors += 1
+            else:
+                if not full:
+                    linenumbers.append(linenumber)
+                    offsets.append(start + line_start)
+                else:
+                    truncated = True
+                    if query.accepts(terms):
+                        finished = True
+                        break
+
+            # Only 1 hit per line
+            pos, length, term = find(line_end)
+
+        start = end
+        if start < size:
+            linenumber += block.count(b"\n", counted)
+
+    return (linenumbers, offsets, spans, truncated)
+
+def _byte_spans(block: bytes, find: Callable, term_count: int, line_start: int, line_end: int, first: tuple[int, int, int], index: int,
+                spans: array, terms: set[int]):
+    # Columns count characters: hits start and end on character boundaries, so the text between 2 hits always decodes
+    # on its own (a fuzzy hit can hold non ASCII characters)
+    column = 0
+    previous = line_start
+    hit, length, term = first
+    while hit != -1:
+        terms.add(term)
+        if spans is not None and len(spans) < MAX_SPANS * 3:
+            column += len(block[previous:hit].decode("utf8"))
+            spans.extend((index, column, len(block[hit:hit + length].decode("utf8"))))
+            previous = hit
+        elif term_count == 1:
+            break
+        hit, length, term = find(hit + length, line_end)
+
+def is_binary(data: bytes) -> bool:
+    """ True when the start of the content ('data' from its first byte) has a NUL byte """
+    return data.find(b"\0", 0, SNIFF_BYTES) != -1
+
+def _has_single_cr(data: bytes) -> bool:
+    # Checked per block, a memory mapped file can't be counted as a whole
+    for start in range(0, len(data), BLOCK_SIZE):
+        block = data[start:start + BLOCK_SIZE + 1]
+        carriage_returns = block.count(b"\r", 0, BLOCK_SIZE)
+        if carriage_returns and carriage_returns != block.count(b"\r\n"):
+            return True
+    return False
@@ -0,0 +1,202 @@
+import os
+import time
+import queue
+import fnmatch
+import logging
+import threading
+from typing import Callable, Iterator
+
+import archive_reader
+from duplicate_files import DuplicateFiles
+from ignore_rules import IgnoreRules
+
+class FileWalker(threading.Thread):
+    """ Enumerate the files to search in a separate Thread
+
+    Remarks:
+        The tree is walked only once with 'os.scandir', every entry is matched against all file type patterns. Found files
+        are handed over through a bounded queue, so iterating over the walker can start while the walk continues.
+
+        Like the recursive glob it replaces, names starting with a dot are skipped and symlinked directories are followed.
+        A symlink to a directory that is being walked (one of its own parents) would be walked forever: it is skipped.
+        Directories are recognized by (device, inode), one stat per directory, so a loop is found whatever path leads
+        into it.
+
+        With 'archives', compressed files and zip archives are matched on their content: see archive_reader.entries.
+
+        With 'duplicates', every file found is registered there (in the walker thread) and only the first path of a
+        file is yielded. Its (device, inode) comes from the directory listing: the inode of the entry on the device of
+        its directory, only a symlink is stat'ed.
+
+        'rules' are applied while walking: excluded directories are not entered at all, excluded or too large files
+        are not listed. Only files matching the file types are checked against the rules.
+
+    Attributes:
+        _root (str): directory to start the walk
+        _patterns (list[str]): file type patterns, e.g. '*.md'
+        _stopped (Callable): returns True when the walk should be stopped
+        _archives (bool): yield the members of zip archives and compressed files of which the content matches
+        _rules (IgnoreRules): files and directories to skip, None to skip nothing
+        _duplicates (DuplicateFiles): collapses the paths of the same file, None to yield every path
+        _q (queue.Queue): found files
+        seconds (float): duration of the walk
+        count (int): number of files found
+        ignored (int): number of files and directories skipped because of the rules
+        logger (Logger)
+    Args:
+        root (str)
+        file_types (str): comma separated file type patterns
+        stopped (Callable[[], bool])
+        archives (bool)
+        rules (IgnoreRules)
+        duplicates (DuplicateFiles)
+    """
+
+    QUEUE_SIZE = 10000
+    POLL_INTERVAL = 0.1
+    _DONE = object()
+
+    def __init__(self, root: str, file_types: str, stopped: Callable[[], bool], archives: bool = False, rules: IgnoreRules = None,
+                 duplicates: DuplicateFiles = None):
+        super(FileWalker, self).__init__(daemon = True)
+
+        self._root = root
+        self._patterns = [ftype.strip() for ftype in file_types.split(",") if ftype.strip()]
+        self._stopped = stopped
+        self._archives = archives
+        self._rules = rules
+        self._duplicates = duplicates
+        self._q = queue.Queue(maxsize = FileWalker.QUEUE_SIZE)
+        self.seconds = 0.0
+        self.count = 0
+        self.ignored = 0
+
+        # Logging config
+        self.logger = logging.getLogger(__name__)
+
+    def __iter__(self) -> Iterator[str]:
+        if not self.is_alive():
+            self.start()
+
+        while True:
+            try:
+                file = self._q.get(timeout = FileWalker.POLL_INTERVAL)
+            except queue.Empty:
+                if self._stopped(): # Handle STOP
+                    return
+                continue
+
+            if file is FileWalker._DONE:
+                return
+
+            yield file
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            for file in self.walk():
+                if not self._put(file):
+                    return
+                self.count += 1
+        finally:
+            self.seconds = time.perf_counter() - start
+            self._put(FileWalker._DONE)
+
+    def walk(self) -> Iterator[str]:
+        """ Yield all files below the root matching one of the patterns (each file only once) """
+        # Directory, its path relative to the root, the rules of its parent and the (device, inode) of it and its parents
+        try:
+            dirs = [(self._root, "", self._rules, (_identity(self._root),))]
+        except OSError as e:
+            self.logger.debug(f"Skipped directory [{self._root}]: {e}")
+            return
+
+        while dirs:
+            if self._stopped(): # Handle STOP
+                return
+
+            current, relative, rules, parents = dirs.pop()
+            if rules is not None:
+                rules = rules.for_directory(current, relative)
+            prefix = relative + "/" if relative else ""
+
+            try:
+                with os.scandir(current) as entries:
+                    subdirs = []
+                    for entry in entries:
+                        if entry.name.startswith("."):
+                            continue
+
+                        try:
+                            if entry.is_dir():
+                                identity = self._walkable(entry, prefix, rules, parents)
+                                if identity is not None:
+                                    subdirs.append((entry.path, prefix + entry.name, rules, parents + (identity,)))
+                            elif self._archives and archive_reader.is_archived(entry.name):
+                                if self._allowed(entry, prefix, rules, False):
+                                    for file in archive_reader.entries(entry.path, self._matches):
+                                        if self._duplicates is None or self._duplicates.add(file):
+                                            yield file
+                            elif self._matches(entry.name) and self._allowed(entry, prefix, rules, False):
+                                if self._duplicates is None or self._duplicates.add(entry.path, _file_identity(entry, parents[-1])):
+                                    yield entry.path
+                        except OSError as e:
+                            self.logger.debug(f"Skipped [{entry.path}]: {e}")
+            except OSError as e:
+                # Same as glob: directories which can't be read are skipped
+                self.logger.debug(f"Skipped directory [{current}]: {e}")
+                continue
+
+            # Keep the order of a depth first walk
+            dirs.extend(reversed(subdirs))
+
+    def _allowed(self, entry: os.DirEntry, prefix: str, rules: IgnoreRules, is_dir: bool) -> bool:
+        if rules is None:
+            return True
+
+        if rules.excluded(prefix + entry.name, entry.name, is_dir) or (not is_dir and rules.max_size and entry.stat().st_size > rules.max_size):
+            self.ignored += 1
+            return False
+        return True
+
+    def _walkable(self, entry: os.DirEntry, prefix: str, rules: IgnoreRules, parents: tuple) -> tuple[int, int]:
+        """ (device, inode) of a directory to walk, None when it is skipped (ignored or a loop) """
+        if not self._allowed(entry, prefix, rules, True):
+            return None
+
+        identity = _identity(entry.path)
+        # Some filesystems have no inode numbers (0)
+        if identity[1] and identity in parents:
+            self.logger.debug(f"Skipped symlink loop [{entry.path}] -> [{os.path.realpath(entry.path)}]")
+            return None
+        return identity
+
+    def _matches(self, name: str) -> bool:
+        for pattern in self._patterns:
+            if fnmatch.fnmatch(name, pattern):
+                return True
+        return False
+
+    def _put(self, file) -> bool:
+        # Wait for free space in the queue, but keep checking for STOP
+        while not self._stopped():
+            try:
+                self._q.put(file, timeout = FileWalker.POLL_INTERVAL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+def _identity(path: str) -> tuple[int, int]:
+    # Not DirEntry.stat: on Windows it has no device and inode
+    stat = os.stat(path)
+    return (stat.st_dev, stat.st_ino)
+
+def _file_identity(entry: os.DirEntry, directory: tuple[int, int]) -> tuple[int, int]:
+    # The inode comes with the listing (POSIX), a symlink is followed to its target (None when broken: reported when searched)
+    if entry.is_symlink():
+        try:
+            return _identity(entry.path)
+        except OSError:
+            return None
+    return (directory[0], entry.inode())
@@ -0,0 +1,148 @@
+import os
+import re
+
+class IgnoreRules:
+    """ Decides which files and directories are skipped while walking the tree
+
+    Remarks:
+        Patterns use the syntax of .gitignore files:
+            - '*' and '?' match within a name, '[...]' a character class, '**' any number of directories
+            - a trailing '/' only matches directories: 'node_modules/'
+            - a pattern containing another '/' is matched against the path relative to the directory of the pattern
+              (the root for configured patterns), otherwise against the name at any depth
+            - '!' includes a path again that an earlier pattern excluded, the last matching pattern decides
+            - empty lines and lines starting with '#' are ignored
+
+        Like git, excluded directories are not walked at all, so a file inside one can't be included again.
+
+        The rules for a directory are derived from those of its parent ('for_directory'): with 'gitignore', the
+        patterns of its .gitignore file (when present) are added, for that directory and everything below it.
+
+    Attributes:
+        max_size (int): files larger than this number of bytes are skipped, 0 = no limit
+        gitignore (bool): read the .gitignore files of the directories walked
+    Args:
+        patterns (list[str])
+        max_size (int)
+        gitignore (bool)
+    """
+
+    GITIGNORE = ".gitignore"
+
+    def __init__(self, patterns: list[str] = (), max_size: int = 0, gitignore: bool = False):
+        self.max_size = max_size
+        self.gitignore = gitignore
+        self._rules = [rule for rule in map(_Rule.parse, patterns) if rule is not None]
+
+    @classmethod
+    def create(cls, exclude: str, max_size: int, gitignore: bool) -> "IgnoreRules":
+        """ Rules for the options of a search ('exclude' is comma separated), None when nothing is skipped """
+        patterns = [pattern.strip() for pattern in exclude.split(",") if pattern.strip()]
+        if not patterns and not max_size and not gitignore:
+            return None
+        return cls(patterns, max_size, gitignore)
+
+    def for_directory(self, path: str, relative: str) -> "IgnoreRules":
+        """ Rules for the entries of directory 'path' ('relative' to the root, '' for the root itself) """
+        if not self.gitignore:
+            return self
+
+        try:
+            with open(os.path.join(path, IgnoreRules.GITIGNORE), "r", encoding = "utf8", errors = "replace") as reader:
+                lines = reader.read().splitlines()
+        except OSError:
+            return self
+
+        base = relative + "/" if relative else ""
+        added = [rule for rule in (_Rule.parse(line, base) for line in lines) if rule is not None]
+        if not added:
+            return self
+
+        rules = IgnoreRules(max_size = self.max_size, gitignore = self.gitignore)
+        rules._rules = self._rules + added
+        return rules
+
+    def excluded(self, relative: str, name: str, is_dir: bool) -> bool:
+        """ True when the entry 'relative' to the root (with '/') has to be skipped """
+        for rule in reversed(self._rules):
+            if rule.matches(relative, name, is_dir):
+                return not rule.negate
+        return False
+
+
+class _Rule:
+    """ A single pattern, see IgnoreRules """
+
+    __slots__ = ("base", "regex", "negate", "dir_only", "anchored")
+
+    def __init__(self, base: str, regex: re.Pattern, negate: bool, dir_only: bool, anchored: bool):
+        self.base = base
+        self.regex = regex
+        self.negate = negate
+        self.dir_only = dir_only
+        self.anchored = anchored
+
+    @classmethod
+    def parse(cls, line: str, base: str = "") -> "_Rule":
+        """ Returns None for empty lines and comments """
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            return None
+
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        anchored = "/" in line
+        line = line.lstrip("/")
+        if not line:
+            return None
+
+        return cls(base, re.compile(_translate(line) + r"\Z"), negate, dir_only, anchored)
+
+    def matches(self, relative: str, name: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+        if not self.anchored:
+            return self.regex.match(name) is not None
+
+        # Rules of a .gitignore file only apply below its directory
+        if not relative.startswith(self.base):
+            return False
+        return self.regex.match(relative, len(self.base)) is not None
+
+def _translate(pattern: str) -> str:
+    """ Regex for a gitignore pattern: like fnmatch, but '*' does not match '/' and '**' matches directories """
+    parts = []
+    index = 0
+
+    while index < len(pattern):
+        char = pattern[index]
+        if pattern.startswith("**/", index):
+            parts.append("(?:.*/)?")
+            index += 3
+        elif pattern.startswith("**", index):
+            parts.append(".*")
+            index += 2
+        elif char == "*":
+            parts.append("[^/]*")
+            index += 1
+        elif char == "?":
+            parts.append("[^/]")
+            index += 1
+        elif char == "[" and pattern.find("]", index + 2) != -1:
+            end = pattern.find("]", index + 2)
+            content = pattern[index + 1:end].replace("\\", "\\\\")
+            if content.startswith("!"):
+                content = "^" + content[1:]
+            parts.append(f"[{content}]")
+            index = end + 1
+        elif char == "\\" and index + 1 < len(pattern):
+            parts.append(re.escape(pattern[index + 1]))
+            index += 2
+        else:
+            parts.append(re.escape(char))
+            index += 1
+
+    return "".join(parts)
@@ -1,12 +1,22 @@
+import re
+import time
 import logging
 import queue
 import tkinter as tk
 import subprocess
+from array import array
 from tkinter import ttk
 from tkinter.messagebox import showwarning
 from tkinter.filedialog import askdirectory
 
+from daemon_executor import PyDaemonExecutor
 from process_executor import PyProcessExecutor
+from refine_executor import PyRefineExecutor
+from process_result import ProcessResult, PreviewCache
+from query import Query
+from result_cache import ResultCache
+from results_model import ResultsModel
+from search_options import SearchOptions
 
 class GuiBuilder():
     """ Create the main application window and start the GUI loop
@@ -33,7 +43,19 @@ class Application(tk.Frame):
         master (tkinter.Tk)
         q (queue.Queue)
         results (list)
+        model (ResultsModel): display order and sort keys of 'results'
+        cache (ResultCache): search results per file, reused by the next searches
+        previews (PreviewCache): text of the recently selected results
         cancelled (bool)
+        max_length (int): length of the longest key in the TreeView
+        executor (PyProcessExecutor | PyDaemonExecutor | PyRefineExecutor): running or last search
+        search_input (tuple): input of the running or last search, with the options changing its results (see 'get_search_key')
+        results_input (tuple): search key which produced 'results', None when incomplete
+        base_input (tuple): search key of the last completed full scan
+        base_results (list): results of the last completed full scan
+        after_id (str): id of the scheduled 'on_after_elapsed' call
+        refine_id (str): id of the scheduled 'on_refine' call
+        logger (Logger)
         lf_search (tk.LabelFrame)
         lbl_search_path (tk.Label)
         txt_search_path (tk.Entry)
@@ -44,6 +66,17 @@ class Application(tk.Frame):
         txt_search_text (tk.Entry)
         btn_search (tk.Button)
         btn_cancel (tk.Button)
+        frm_options (tk.Frame)
+        var_use_index (tk.BooleanVar)
+        chk_use_index (tk.Checkbutton)
+        lbl_workers (tk.Label)
+        spn_workers (tk.Spinbox)
+        lbl_mode (tk.Label)
+        cmb_mode (ttk.Combobox)
+        var_ranked (tk.BooleanVar)
+        chk_ranked (tk.Checkbutton)
+        var_archives (tk.BooleanVar)
+        chk_archives (tk.Checkbutton)
         cnt_treeview (TreeViewContainer)
         cnt_text (TextContainer)
         lbl_status (tk.Label)
@@ -56,6 +89,27 @@ class Application(tk.Frame):
     FILE_TYPES = "*.md"
     #~ FILE_TYPES = "*.md,*.markdown,*.txt"
     DELAY = 100
+    BATCH_SIZE = 500        # Max. number of results inserted into the TreeView per DELAY
+    QUEUE_SIZE = 2000       # Max. number of results waiting in the queue
+    WORKERS = 1
+    MAX_ERRORS = 1          # Mode "fuzzy": max. number of edits (insertions, deletions, substitutions) in a hit
+    READ_AHEAD = 4          # Threads reading upcoming files in advance (network drives), 0 = off
+    MAX_MATCHES = 0         # Stop the search after this number of results, 0 = no limit
+    MAX_LINES = 0           # Found lines kept per file, 0 = no limit
+    MAX_SECONDS = 0         # Stop the search after this number of seconds, 0 = no limit
+    EXCLUDE = "node_modules/,__pycache__/,build/,dist/"   # Files and directories skipped (gitignore style patterns)
+    USE_GITIGNORE = True    # Also skip what the .gitignore files in the tree exclude
+    MAX_FILE_SIZE = 0       # Skip files larger than this number of bytes, 0 = no limit
+    SKIP_BINARY = True      # Skip files with binary content
+    DEDUP = True            # Search hard-linked and symlinked files once (their results are shown for every path)
+    DEDUP_CONTENT = False   # Also search files with identical content once (hashes files of the same size)
+    TOP_K = 1000            # "Best first": number of most relevant results shown
+    USE_DAEMON = True       # Let the search daemon (search_daemon.py) search when it is running
+    CACHE_BYTES = 64 << 20  # Memory budget of the result cache
+    PREVIEW_FILES = 8       # Number of selected results of which the text is kept
+    PREVIEW_LINES = 5000    # Max. number of found lines shown in the preview
+    REFINE_DELAY = 300      # Pause in typing (ms) after which the results are refined
+    PROFILE_FILE = ""       # Set to e.g. "search.prof" to profile every search with cProfile
 
     X_PAD_ZERO = (0, 0)
     X_PAD_LEFT = (20, 0)
@@ -73,9 +127,24 @@ class Application(tk.Frame):
 
         self.master = master
         self.create_widgets()
-        self.q = queue.Queue()
+        self.q = queue.Queue(maxsize = Application.QUEUE_SIZE)
         self.results = []
+        self.model = ResultsModel(self.results)
+        self.cnt_treeview.set_model(self.model)
+        self.cache = ResultCache(Application.CACHE_BYTES)
+        self.previews = PreviewCache(Application.PREVIEW_FILES, Application.PREVIEW_LINES)
         self.cancelled = False
+        self.max_length = 0
+        self.executor = None
+        self.search_input = None
+        self.results_input = None
+        self.base_input = None
+        self.base_results = []
+        self.after_id = None
+        self.refine_id = None
+
+        # Logging config
+        self.logger = logging.getLogger(__name__)
 
     def create_widgets(self):
         # ================
@@ -119,6 +188,7 @@ class Application(tk.Frame):
         self.txt_search_text.focus_set()
         self.txt_search_text.grid(row = 1, column = 1, sticky="W", columnspan = 3, padx = Application.X_PAD_RIGHT, pady = Application.Y_PAD_TOP_BOT)
         self.txt_search_text.configure(bg='white')
+        self.txt_search_text.bind("<KeyRelease>", self.on_search_key)
 
         # Search: Button
         self.btn_search = tk.Button(self.lf_search, text = "Search", command = self.on_search, width = 8)
@@ -130,6 +200,48 @@ class Application(tk.Frame):
         self.btn_cancel.grid(row = 1, column = 3, sticky="E", padx = Application.X_PAD_LEFT, pady = Application.Y_PAD_TOP_BOT)
         self.btn_cancel.configure(state = "disabled")
 
+        # Options: Frame
+        self.frm_options = tk.Frame(self.lf_search)
+        self.frm_options.grid(row = 2, column = 1, sticky="W", columnspan = 3, padx = Application.X_PAD_ZERO, pady = Application.Y_PAD_BOTTOM)
+        self.frm_options.configure(bg='white')
+
+        # Index: Checkbutton
+        self.var_use_index = tk.BooleanVar(value = False)
+        self.chk_use_index = tk.Checkbutton(self.frm_options, text = "Use index", variable = self.var_use_index)
+        self.chk_use_index.grid(row = 0, column = 0, sticky="W", padx = Application.X_PAD_ZERO)
+        self.chk_use_index.configure(bg='white')
+
+        # Workers: Label + Spinbox (0 = all cores)
+        self.lbl_workers = tk.Label(self.frm_options, text = "Workers:")
+        self.lbl_workers.grid(row = 0, column = 1, sticky="W", padx = Application.X_PAD_LBL)
+        self.lbl_workers.configure(bg='white')
+
+        self.spn_workers = tk.Spinbox(self.frm_options, from_ = 0, to = 64, width = 4)
+        self.spn_workers.delete(0, tk.END)
+        self.spn_workers.insert(tk.END, Application.WORKERS)
+        self.spn_workers.grid(row = 0, column = 2, sticky="W", padx = Application.X_PAD_ZERO)
+
+        # Mode: Label + Combobox (how the search text is read)
+        self.lbl_mode = tk.Label(self.frm_options, text = "Mode:")
+        self.lbl_mode.grid(row = 0, column = 3, sticky="W", padx = Application.X_PAD_LBL)
+        self.lbl_mode.configure(bg='white')
+
+        self.cmb_mode = ttk.Combobox(self.frm_options, values = Query.MODES, state = "readonly", width = 6)
+        self.cmb_mode.set(Query.MODES[0])
+        self.cmb_mode.grid(row = 0, column = 4, sticky="W", padx = Application.X_PAD_ZERO)
+
+        # Ranked: Checkbutton (only the TOP_K most relevant results, best first)
+        self.var_ranked = tk.BooleanVar(value = False)
+        self.chk_ranked = tk.Checkbutton(self.frm_options, text = "Best first", variable = self.var_ranked)
+        self.chk_ranked.grid(row = 0, column = 5, sticky="W", padx = Application.X_PAD_LBL)
+        self.chk_ranked.configure(bg='white')
+
+        # Archives: Checkbutton (also search inside compressed files and zip archives)
+        self.var_archives = tk.BooleanVar(value = False)
+        self.chk_archives = tk.Checkbutton(self.frm_options, text = "Archives", variable = self.var_archives)
+        self.chk_archives.grid(row = 0, column = 6, sticky="W", padx = Application.X_PAD_ZERO)
+        self.chk_archives.configure(bg='white')
+
         # =============================================
         # Table (TreeView) inside Frame with results
         # =============================================
@@ -163,30 +275,114 @@ class Application(tk.Frame):
             self.txt_search_path.configure(state = "disabled")
 
     def on_search(self):
+        # Ignore <Return> while a search is running
+        if self.btn_search['state'] == "disabled":
+            return
+
         invalid_input = self.check_input()
 
         if not invalid_input:
-            # Refresh result
-            self.results.clear()
+            input = self.get_input()
 
-            # Refresh TreeView
-            self.cnt_treeview.tvw_results.delete(*self.cnt_treeview.tvw_results.get_children())
-            self.cnt_treeview.apply_width(0)
+            # Prepare GUI for result: the Search button always scans (the result cache keeps that cheap), so new and
+            # changed files are found
+            self.start_search(input, None)
+            self.toggle_search()
+        else:
+            showwarning("Check input!", invalid_input)
+
+    def on_search_key(self, event: tk.Event):
+        """ Search as you type: refine the results after a short pause in typing
 
-            # Refresh text output
-            self.cnt_text.refresh()
+        Args:
+            event (tk.Event)
+        """
+        if self.refine_id is not None:
+            self.master.after_cancel(self.refine_id)
+        self.refine_id = self.master.after(Application.REFINE_DELAY, self.on_refine)
 
-            # Call Executor            
-            input = (self.txt_search_path.get(), self.txt_file_types.get(), self.txt_search_text.get())
-            self.executor = PyProcessExecutor(input, self.q)
-            self.executor.start()
+    def on_refine(self):
+        self.refine_id = None
 
-            # Prepare GUI for result
+        input = self.get_input()
+        if self.check_input() or self.get_search_key(input) == self.search_input:
+            return
+
+        # Only refinements are started while typing, a full scan needs the Search button
+        source = self.get_refine_source(input)
+        if source is None:
+            return
+
+        running = self.btn_search['state'] == "disabled"
+        if running:
+            # Never interrupt a full scan, but do cancel a stale refinement
+            if not isinstance(self.executor, PyRefineExecutor):
+                return
+
+            self.executor.stop()
+            self.master.after_cancel(self.after_id)
+
+        self.start_search(input, source)
+        if not running:
             self.toggle_search()
-            self.update_status("Searching...")
-            self.master.after(Application.DELAY, self.on_after_elapsed)
+
+    def start_search(self, input: tuple[str,str,str,str], source: list):
+        """ Clear the previous result and start a search
+
+            Args:
+                input (tuple[str,str,str,str]): path, file types, text to search for and query mode
+                source (list): results to refine, a full scan is started when None
+        """
+        # Refresh result
+        self.model.clear()
+        self.results_input = None
+
+        # Ranked: a search delivers its results best first, a refinement is inserted by score
+        if self.var_ranked.get():
+            self.model.sort("score", True)
+
+        # Refresh TreeView
+        self.cnt_treeview.clear()
+        self.cnt_treeview.apply_width(0)
+
+        # Refresh text output
+        self.cnt_text.refresh()
+
+        self.max_length = 0
+
+        # Call Executor (with a new bounded queue, so results of a previous search can never end up in this one)
+        self.q = queue.Queue(maxsize = Application.QUEUE_SIZE)
+        if source is not None:
+            self.executor = PyRefineExecutor(source, input[2], self.q, self.get_options())
+            self.update_status("Refining...")
         else:
-            showwarning("Check input!", invalid_input)
+            # The daemon has warm listings and caches, search in this process when it is not running
+            executor = PyDaemonExecutor.connect(input, self.q, self.get_options(), self.cache) if Application.USE_DAEMON else None
+            if executor is not None:
+                self.executor = executor
+                self.update_status("Searching (daemon)...")
+            else:
+                self.executor = PyProcessExecutor(input, self.q, self.get_options(), self.cache)
+                self.update_status("Searching...")
+
+        self.search_input = self.get_search_key(input)
+        self.executor.start()
+        self.after_id = self.master.after(Application.DELAY, self.on_after_elapsed)
+
+    def get_refine_source(self, input: tuple[str,str,str,str]) -> list:
+        """ Return the smallest set of results 'input' is a refinement of, None when a full scan is needed """
+        key = self.get_search_key(input)
+        if self.results_input is not None and PyRefineExecutor.is_refinement(self.results_input, key):
+            return list(self.results)
+
+        if self.base_input is not None and PyRefineExecutor.is_refinement(self.base_input, key):
+            return self.base_results
+
+        return None
+
+    def get_search_key(self, input: tuple[str,str,str,str]) -> tuple:
+        """ 'input' followed by the options which change the results, e.g. a different ignore rule or ranking """
+        return input + PyRefineExecutor.options_key(self.get_options())
 
     def on_search_enter(self, event: tk.Event):
         """
@@ -203,63 +399,104 @@ class Application(tk.Frame):
     def on_after_elapsed(self):
         """ Retrieve results from thread and display results
 
-            This method checks periodically, after DELAY time, if the launched thread is finished.
-            When finished, the queue from this thread is read.
+            This method checks periodically, after DELAY time, for new results of the launched thread. Every check
+            inserts at most BATCH_SIZE results, so the GUI stays responsive while large result sets come in. The queue
+            is bounded (QUEUE_SIZE): when the GUI falls behind, the thread waits until results are taken off the queue.
 
-            Cancelling can occur in the following 2 cases:
-                - Before the thread is finished
-                - While reading out the queue
+            Cancelling can occur at every check, the results found so far stay visible.
         """
-        # Check for cancel in case thread not yet finished
+        # Check for cancel
         if self.cancelled == True:
             self.q.queue.clear()
             self.toggle_search()            
             return
 
-        # Only read queue when thread is done
-        if not self.executor.is_alive():
-            max_length = 0
+        # Check before reading, so results put right before the thread ended are not missed
+        alive = self.executor.is_alive()
+        done = False
+        first_position = None
+        start = time.perf_counter()
 
+        for _ in range(Application.BATCH_SIZE):
             try:
-                for data in iter(self.q.get_nowait, PyProcessExecutor.SENTINEL):
-                    # Check for cancel while reading out queue
-                    if self.cancelled == True:
-                        self.q.queue.clear()
-                        self.toggle_search()            
-                        return
-
-                    # Insert data into TreeView and result
-                    self.results.append(data)
-                    self.cnt_treeview.insert(parent = "", index = tk.END, text = data.key)
-                        
-                    self.cnt_treeview.update()
-
-                    # Determine max length of TreeView to determine largest entry
-                    if len(data.key) > max_length:
-                        max_length = len(data.key)
-
-                # Queue succesfully read until the end ('Sentinel' result is reached)
-                self.toggle_search()
-                self.update_status(f"Search done (matches: { len(self.cnt_treeview.tvw_results.get_children()) })")
-                self.cnt_treeview.apply_width(max_length)
-
-                return
+                data = self.q.get_nowait()
             except queue.Empty:
-                self.update_status("Search failed.")
-                return
+                break
 
-        self.master.after(Application.DELAY, self.on_after_elapsed)
+            # Queue succesfully read until the end ('Sentinel' result is reached)
+            if data == PyProcessExecutor.SENTINEL:
+                done = True
+                break
+
+            # Add data to the result, the TreeView is updated once per batch
+            position = self.model.add(data)
+            if first_position is None or position < first_position:
+                first_position = position
+
+            # Determine max length of TreeView to determine largest entry
+            if len(data.key) > self.max_length:
+                self.max_length = len(data.key)
+
+        # Update the page shown and resize once per batch, Tk redraws the TreeView when idle again
+        if first_position is not None:
+            self.cnt_treeview.rows_added(first_position)
+        self.cnt_treeview.apply_width(self.max_length)
+        self.executor.stats.timings["render"] += time.perf_counter() - start
+
+        if done:
+            # Complete results can be refined by the next search (results cut off by a limit are not complete)
+            stats = self.executor.stats
+            if not stats.truncated and not stats.truncated_files:
+                self.results_input = self.search_input
+                if not isinstance(self.executor, PyRefineExecutor):
+                    self.base_input = self.search_input
+                    self.base_results = list(self.results)
+
+            truncated = ", truncated" if stats.truncated or stats.truncated_files else ""
+            self.toggle_search()
+            self.update_status(f"Search done (matches: { len(self.results) }{ truncated }) - { self.executor.stats.summary() }")
+            self.logger.info(f"Search done (matches: { len(self.results) }): { self.executor.stats.summary() }")
+            return
+
+        if not alive and self.q.empty():
+            self.toggle_search()
+            self.update_status("Search failed.")
+            return
+
+        self.update_status(f"Searching... (matches: { len(self.results) })")
+        self.after_id = self.master.after(Application.DELAY, self.on_after_elapsed)
 
     def on_select_item(self, event: tk.Event):
-        current_key = self.cnt_treeview.get_current_item().get("text")
-        self.cnt_text.file = current_key.replace("\\","/")
-        
-        for data in self.results:
-            if data.key == current_key:
-                self.cnt_text.insert_text(data.dat)                
-                break
-        
-        self.cnt_text.highlight_text(self.txt_search_text.get())
+        data = self.cnt_treeview.get_current_result()
+        if data is None:
+            return
+
+        self.cnt_text.file = data.key.replace("\\","/")
+
+        # The text of a compact result is read from the file now (only the lines shown)
+        try:
+            text = self.previews.get(data)
+        except OSError as e:
+            self.logger.error(f"Error while reading file [{data.key}]: {e}")
+            self.cnt_text.insert_text([f"<<file can't be read: {e}>>\n"])
+            return
+
+        # The file changed since the search: its lines can't be shown (nor highlighted) any more
+        if text[-1:] == [ProcessResult.FILE_CHANGED]:
+            self.cnt_text.insert_text(text)
+            return
+
+        self.cnt_text.insert_text(text, data.line_count + data.path_found - len(text))
+        if data.terms is not None:
+            self.update_status(f"Terms found in [{data.key}]: {', '.join(data.terms)}")
+        if data.distance is not None:
+            self.update_status(f"Closest match in [{data.key}]: {data.distance} edit(s)")
+
+        # The spans found by the search are used, results without spans are searched again
+        if data.spans is not None:
+            self.cnt_text.highlight_spans(text, data.spans)
+        else:
+            self.cnt_text.highlight_text(self.txt_search_text.get())
 
     def toggle_search(self):
         if self.btn_search['state'] == "disabled":
@@ -277,6 +514,17 @@ class Application(tk.Frame):
         """
         self.lbl_status.config(text = status)
 
+    def get_input(self) -> tuple[str,str,str,str]:
+        return (self.txt_search_path.get(), self.txt_file_types.get(), self.txt_search_text.get(), self.cmb_mode.get())
+
+    def get_options(self) -> SearchOptions:
+        return SearchOptions(use_index = self.var_use_index.get(), workers = int(self.spn_workers.get()), profile = Application.PROFILE_FILE,
+                             mode = self.cmb_mode.get(), max_errors = Application.MAX_ERRORS, read_ahead = Application.READ_AHEAD, max_matches = Application.MAX_MATCHES,
+                             max_lines = Application.MAX_LINES, max_seconds = Application.MAX_SECONDS,
+                             archives = self.var_archives.get(), exclude = Application.EXCLUDE, gitignore = Application.USE_GITIGNORE,
+                             max_size = Application.MAX_FILE_SIZE, skip_binary = Application.SKIP_BINARY,
+                             dedup = Application.DEDUP, dedup_content = Application.DEDUP_CONTENT, top_k = Application.TOP_K if self.var_ranked.get() else 0)
+
     def check_input(self) -> str:
         """If input is OK return empty, else return error"""
         
@@ -288,6 +536,16 @@ class Application(tk.Frame):
             
         if len(self.txt_file_types.get()) == 0:
             return "At least 1 file type has to be provided."
+
+        if not self.spn_workers.get().isdigit():
+            return "The number of workers has to be a positive number (0 = all cores)."
+
+        try:
+            Query.compile(self.txt_search_text.get(), self.cmb_mode.get(), Application.MAX_ERRORS)
+        except re.error as e:
+            return f"Invalid regular expression: {e}"
+        except ValueError as e:
+            return str(e)
             
         return ""
 
@@ -303,15 +561,34 @@ class TreeViewContainer(tk.Frame):
         In this example we use the font 'Consolas' for the content as this is a 'Monospaced' font which makes the calculation of the
         width easier. 
 
+        The TreeView only holds one page (PAGE_SIZE rows) of the results in 'model', the Prev / Next buttons show the other pages.
+        The item id of a row is the index of its result in the model, so the selected result is found without a search. Sorting
+        is done by the model on precomputed keys, afterwards only the current page is rendered again.
+
     Attributes:
         tvw_results (ttk.Treeview): TreeView component
+        frm_pager (tk.Frame)
+        btn_prev (tk.Button)
+        lbl_page (tk.Label)
+        btn_next (tk.Button)
+        model (ResultsModel): results shown in the TreeView
+        page (int): number of the page shown
+        shown (int): number of rows on the page shown
     """
     CHAR_WIDTH = 7.2 # Approx. width for Consolas 10
+    PAGE_SIZE = 500
+    MATCHES_WIDTH = 80
+    MODIFIED_WIDTH = 140
+    SCORE_WIDTH = 70
+    TIME_FORMAT = "%Y-%m-%d %H:%M"
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         
         self.configure(bg='white')
+        self.model = None
+        self.page = 0
+        self.shown = 0
 
         # Treeview style (Important: use a monospaced font like 'Consolas' -> for use with calculation of minwidth)
         style = ttk.Style()
@@ -319,13 +596,17 @@ class TreeViewContainer(tk.Frame):
         style.configure("mystyle.Treeview", font=("Consolas", 10)) # Modify the font of the body
 
         # The actual TreeView
-        self.tvw_results = ttk.Treeview(self, style = "mystyle.Treeview")
-        self.insert = self.tvw_results.insert
-        self.move = self.tvw_results.move
+        self.tvw_results = ttk.Treeview(self, style = "mystyle.Treeview", columns = ("matches", "modified", "score"))
         
         self.tvw_results.grid(row = 0, column = 0, sticky="NSEW")
         self.tvw_results.column("#0", minwidth = 0, stretch = tk.YES)
-        self.tvw_results.heading("#0", text = "Found results", anchor = tk.W, command = lambda : self.treeview_sort(True))
+        self.tvw_results.column("matches", width = TreeViewContainer.MATCHES_WIDTH, stretch = tk.NO, anchor = tk.E)
+        self.tvw_results.column("modified", width = TreeViewContainer.MODIFIED_WIDTH, stretch = tk.NO)
+        self.tvw_results.column("score", width = TreeViewContainer.SCORE_WIDTH, stretch = tk.NO, anchor = tk.E)
+        self.tvw_results.heading("#0", text = "Found results", anchor = tk.W, command = lambda : self.treeview_sort("path", True))
+        self.tvw_results.heading("matches", text = "Matches", anchor = tk.E, command = lambda : self.treeview_sort("matches", True))
+        self.tvw_results.heading("modified", text = "Modified", anchor = tk.W, command = lambda : self.treeview_sort("modified", True))
+        self.tvw_results.heading("score", text = "Score", anchor = tk.E, command = lambda : self.treeview_sort("score", True))
 
         # Scrollbars + attach scrollbars to TreeView
         sb_vertical = tk.Scrollbar(self, orient = "vertical", command = self.tvw_results.yview)
@@ -334,35 +615,97 @@ class TreeViewContainer(tk.Frame):
         sb_vertical.grid(row = 0, column = 1, sticky = "NS")
         sb_horizontal.grid(row = 1, column = 0, sticky = "EW")
 
+        # Pager
+        self.frm_pager = tk.Frame(self, bg = "white")
+        self.frm_pager.grid(row = 2, column = 0, columnspan = 2, sticky = "E")
+        self.btn_prev = tk.Button(self.frm_pager, text = "<", width = 3, state = "disabled", command = lambda : self.show_page(self.page - 1))
+        self.btn_prev.grid(row = 0, column = 0)
+        self.lbl_page = tk.Label(self.frm_pager, text = "", bg = "white")
+        self.lbl_page.grid(row = 0, column = 1, padx = (10, 10))
+        self.btn_next = tk.Button(self.frm_pager, text = ">", width = 3, state = "disabled", command = lambda : self.show_page(self.page + 1))
+        self.btn_next.grid(row = 0, column = 2)
+
         # Configure and position grid for TreeView
         self.grid_rowconfigure(0, weight = 1)
         self.grid_columnconfigure(0, weight = 1)
 
+    def set_model(self, model: ResultsModel):
+        self.model = model
+        self.clear()
+
+    def clear(self):
+        self.tvw_results.delete(*self.tvw_results.get_children())
+        self.page = 0
+        self.shown = 0
+        self.update_pager()
+
     def apply_width(self, width: int):
-        # Take the TreeView width minus 2 for the boundaries
-        self.tvw_results.column("#0", width = self.tvw_results.winfo_width() -2, minwidth = int(width * TreeViewContainer.CHAR_WIDTH))
+        # Take the TreeView width minus 2 for the boundaries and the other columns
+        other = TreeViewContainer.MATCHES_WIDTH + TreeViewContainer.MODIFIED_WIDTH + TreeViewContainer.SCORE_WIDTH
+        self.tvw_results.column("#0", width = self.tvw_results.winfo_width() -2 - other, minwidth = int(width * TreeViewContainer.CHAR_WIDTH))
 
     def bind_single_click(self, method):
         # Note that the callback will be executed before the focus in the tree changed, i.e. you will get the item that was selected before 
         # you clicked the new item. One way to solve this is to use the event type ButtonRelease instead.
         self.tvw_results.bind("<ButtonRelease-1>", method)
-        
-    def treeview_sort(self, reverse):
-        col = "#0"
-        
-        l = [(self.tvw_results.item(k)["text"], k) for k in self.tvw_results.get_children()]
-        l.sort(reverse = reverse)
-        
-        # rearrange items in sorted positions
-        for index, (val, k) in enumerate(l):
-            self.tvw_results.move(k, '', index)
-            
+
+    def show_page(self, page: int):
+        """ Render the rows of page 'page' (clipped to the available pages) """
+        last = max(0, (len(self.model) - 1) // TreeViewContainer.PAGE_SIZE)
+        self.page = min(max(page, 0), last)
+
+        self.tvw_results.delete(*self.tvw_results.get_children())
+        self.shown = 0
+        self._insert_rows(self.page * TreeViewContainer.PAGE_SIZE, TreeViewContainer.PAGE_SIZE)
+        self.update_pager()
+
+    def rows_added(self, position: int):
+        """ Update the page shown after results were added, 'position' is the lowest display position of the new results """
+        start = self.page * TreeViewContainer.PAGE_SIZE
+
+        if position < start + TreeViewContainer.PAGE_SIZE:
+            if position == start + self.shown:
+                # Appended at the end of the page: only insert the new rows
+                self._insert_rows(position, TreeViewContainer.PAGE_SIZE - self.shown)
+            else:
+                self.show_page(self.page)
+                return
+
+        self.update_pager()
+
+    def update_pager(self):
+        count = len(self.model) if self.model is not None else 0
+        start = self.page * TreeViewContainer.PAGE_SIZE
+
+        if count == 0:
+            self.lbl_page.config(text = "")
+        else:
+            self.lbl_page.config(text = f"{start + 1}-{start + self.shown} of {count}")
+        self.btn_prev.configure(state = "normal" if self.page > 0 else "disabled")
+        self.btn_next.configure(state = "normal" if start + TreeViewContainer.PAGE_SIZE < count else "disabled")
+
+    def treeview_sort(self, column: str, reverse: bool):
+        self.model.sort(column, reverse)
+        self.show_page(0)
+
         # Reset heading action after sort
-        self.tvw_results.heading(col, command = lambda: self.treeview_sort(not reverse))
+        heading = "#0" if column == "path" else column
+        self.tvw_results.heading(heading, command = lambda: self.treeview_sort(column, not reverse))
 
-    def get_current_item(self) -> ttk.Treeview.item:
+    def get_current_result(self) -> ProcessResult:
         current_item = self.tvw_results.focus()
-        return self.tvw_results.item(current_item)
+        if not current_item:
+            return None
+        return self.model.get(int(current_item))
+
+    def _insert_rows(self, position: int, count: int):
+        for index in self.model.page(position, count):
+            result = self.model.get(index)
+            modified = time.strftime(TreeViewContainer.TIME_FORMAT, time.localtime(result.mtime)) if result.mtime else ""
+            matches = f"{result.line_count}+" if result.truncated else result.line_count
+            self.tvw_results.insert(parent = "", index = tk.END, iid = str(index), text = result.key,
+                                    values = (matches, modified, f"{result.score:.2f}"))
+            self.shown += 1
 
 
 class TextContainer(tk.Frame):
@@ -394,16 +737,19 @@ class TextContainer(tk.Frame):
         self.grid_rowconfigure(0, weight = 1)
         self.grid_columnconfigure(0, weight = 1)
 
-    def insert_text(self, text: list[str]):
+    def insert_text(self, text: list[str], more: int = 0):
         """ Remarks:
             - We need to enable the widget to be able to insert text.
             - Clear the widget before a new insert
+            - All text is inserted with a single call, 'more' is the number of lines not shown
         """
         self.txt_display.configure(state = "normal")
         self.txt_display.delete('1.0',tk.END)
 
-        for txt in text:
-            self.txt_display.insert(tk.END, txt)        
+        content = "".join(text)
+        if more > 0:
+            content += f"<<{more} more lines not shown>>\n"
+        self.txt_display.insert(tk.END, content)
                 
         self.txt_display.configure(state = "disabled")
 
@@ -424,6 +770,33 @@ class TextContainer(tk.Frame):
                 idx = lastidx
 
         self.txt_display.tag_config("found", background="yellow", foreground="black")
+
+    def highlight_spans(self, text: list[str], spans: array):
+        """ Highlight the match spans recorded by the search, with a single 'tag add' for all of them
+
+            Args:
+                text (list[str]): the lines shown, optionally starting with the "<<text found in path>>" entry
+                spans (array): (found line, column, length) triples, see ProcessResult
+        """
+        self.txt_display.tag_remove("found", '1.0', tk.END)
+
+        # Line 1 of the widget is the path entry, if present
+        first = 2 if text and text[0] == ProcessResult.PATH_FOUND else 1
+        shown = len(text) - first + 1
+
+        indexes = []
+        for position in range(0, len(spans), 3):
+            line, column, length = spans[position:position + 3]
+            if line >= shown:
+                break
+            # The column counts from the start of the text, after "N: "
+            column += text[line + first - 1].find(": ") + 2
+            indexes.append(f"{line + first}.{column}")
+            indexes.append(f"{line + first}.{column + length}")
+
+        if indexes:
+            self.txt_display.tag_add("found", *indexes)
+        self.txt_display.tag_config("found", background="yellow", foreground="black")
         
     def get_current_line(self) -> (int, int):
         # Retrieve line based on cursor position
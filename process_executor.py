@@ -1,9 +1,28 @@
+import os
+import time
+import cProfile
 import threading
-import glob
 import queue
+import sqlite3
 import logging
+import logging.handlers
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Iterable, Iterator
 
+import archive_reader
+import file_matcher
+import ranking
+from duplicate_files import DuplicateFiles
+from file_walker import FileWalker
+from ignore_rules import IgnoreRules
 from process_result import ProcessResult
+from query import Query
+from read_ahead import ReadAhead
+from result_cache import ResultCache
+from search_options import SearchOptions
+from search_stats import SearchStats
+from trigram_index import TrigramIndex
 
 class PyProcessExecutor(threading.Thread):
     """ Execute the search in a separate Thread
@@ -13,16 +32,33 @@ class PyProcessExecutor(threading.Thread):
         _file_type (str): search in files with specified file types only
         _txt (str): text to search for
         _q (queue.Queue): Object to share 'Thread-safe' data between threads
+        _options (SearchOptions): optional search settings
+        _cache (ResultCache): results of previous searches, can be None
+        _file_stats (dict): parallel mode: stat of the files handed to the workers, to store their results in the cache
+        _files (list[str]): files to search (e.g. a listing kept by the daemon), None to walk the path
         _stop_event (threading.Event): used to indicate thread should be stopped
+        _walker (FileWalker): enumerates the files to search
+        _start (float): perf_counter at the start of the search
+        _found (int): number of results found
+        _top (ranking.TopResults): ranked search: the best results so far, put on the queue when the search ends
+        _duplicates (DuplicateFiles): dedup: other paths of the files searched, their results are derived, None when off
+        stats (SearchStats): timings and counters of the search
         logger (Logger)
     Args:
         input (tuple[str,str,str])
         q (queue.Queue)
+        options (SearchOptions)
+        cache (ResultCache)
+        files (list[str])
     """
 
     SENTINEL = ProcessResult("_end", [])
+    CHUNK_BYTES = 8 << 20   # Parallel mode: approx. number of bytes handed to a worker at once
+    CHUNK_FILES = 256       # Parallel mode: max. number of files handed to a worker at once
+    POLL_INTERVAL = 0.1     # Seconds between checks for STOP while waiting on the workers or the queue
 
-    def __init__(self, input: tuple[str,str,str], q: queue.Queue):
+    def __init__(self, input: tuple[str,str,str], q: queue.Queue, options: SearchOptions = None, cache: ResultCache = None,
+                 files: list[str] = None):
         super(PyProcessExecutor, self).__init__(daemon = True)
         
         self._path = input[0]
@@ -30,39 +66,84 @@ class PyProcessExecutor(threading.Thread):
         self._txt = input[2]
 
         self._q = q
+        self._options = options if options is not None else SearchOptions()
+        self._cache = cache
+        self._file_stats = {}
+        self._files = files
         self._stop_event = threading.Event()
+        self._walker = None
+        self._start = None
+        self._found = 0
+        self._top = ranking.TopResults(self._options.top_k) if self._options.top_k > 0 else None
+        self._duplicates = None
+        if self._options.dedup or self._options.dedup_content:
+            self._duplicates = DuplicateFiles(self._options.dedup_content)
+        self.stats = SearchStats()
 
         # Logging config
         self.logger = logging.getLogger(__name__)
 
     def run(self):
-        files = []
-        
         #~ self.logger.debug("run started")
 
-        # Split file types
-        ftypes = self._file_type.split(",")        
-        types = [self._path + "/**/" + ftype for ftype in ftypes]
+        # Opt-in: profile the search (worker processes are not included)
+        if self._options.profile:
+            profiler = cProfile.Profile()
+            profiler.runcall(self._search)
+            profiler.dump_stats(self._options.profile)
+            self.logger.info(f"Search profile written to [{self._options.profile}]")
+        else:
+            self._search()
+
+    def _search(self):
+        start = self._start = time.perf_counter()
 
-        # Search files recursively based on filetype
-        for type in types:
-            if self.stopped(): # Handle STOP
+        files = self._find_files()
+
+        # Only keep the files which might contain the search text
+        if self._options.use_index:
+            with self.stats.phase("index"):
+                files = self._filter_indexed(files)
+            if files is None: # Handle STOP
                 return
-            
-            for found in glob.glob(type, recursive = True):
-                files.append(found)
 
         # Process found files
-        for file in files:
-            if self.stopped(): # Handle STOP
+        if self._workers() > 1:
+            if not self._run_parallel(files):
                 return
-            
-            result = self._process_file(file)
-            if result is not None:
-                self._q.put(result)
+        else:
+            loaded = self._read_ahead(files) if self._options.read_ahead > 0 else ((file, None, None) for file in files)
+
+            for file, stat, data in loaded:
+                if self.stopped(): # Handle STOP
+                    return
+                if self._halted(): # Limit reached: end with the results so far
+                    break
+                
+                self._searched(file, self._process_file(file, stat, data))
+
+            if isinstance(loaded, ReadAhead):
+                self.stats.timings["io"] += loaded.waited
+
+        # Aliases found after their file was searched
+        if self._duplicates is not None:
+            self._emit_aliases()
+            self.stats.duplicates = self._duplicates.count
+
+        if self._top is not None:
+            self._put_ranked()
+
+        if self._walker is not None:
+            self.stats.timings["enumerate"] = self._walker.seconds
+            self.stats.ignored = self._walker.ignored
+        self.stats.wall = time.perf_counter() - start
+        self.logger.info(f"Search for [{self._txt}] in [{self._path}]: {self.stats.summary()}")
+
+        if self._cache is not None:
+            self.logger.debug(f"Result cache: {self._cache.stats()}")
 
         # Indicate end of result 
-        self._q.put(PyProcessExecutor.SENTINEL)  
+        self._put(PyProcessExecutor.SENTINEL)  
 
     def stop(self):
         self._stop_event.set()
@@ -70,34 +151,335 @@ class PyProcessExecutor(threading.Thread):
     def stopped(self):
         return self._stop_event.is_set()
 
-    def _process_file(self, file: str) -> ProcessResult:
-        found_text = []        
+    def _halted(self) -> bool:
+        """ True when the search has to end: stopped, or one of the limits of the options was reached """
+        if self.stopped() or self.stats.truncated:
+            return True
 
-        search_param = self._txt
+        max_seconds = self._options.max_seconds
+        if max_seconds and self._start is not None and time.perf_counter() - self._start > max_seconds:
+            self.stats.truncated = f"time limit of {max_seconds}s reached"
+            return True
 
-        # If the specified filepath contains the search pattern, add it to the results
-        if file.find(search_param) != -1:
-            found_text.append("<<text found in path>>\n")
-        
-        linenumber = 0
-        with open(file, "r", encoding = "utf8") as reader:
-            while True:
-                try:
-                    line = reader.readline()
-                    linenumber += 1
-                    
-                    if line == '':
-                        break                        
-                    
-                    # Ignore case
-                    if search_param.lower() in line.lower():
-                        found_text.append(str(linenumber) + ": " + line)
-                except UnicodeDecodeError as e:
-                    # Log error for current file, but continue with the rest
-                    self.logger.error(f"Error while reading file [{file}]: {e}")
-
-        # Only return result if the file contains the search pattern in the text or filename
-        if len(found_text) > 0:
-            return ProcessResult(file, found_text)
+        return False
+
+    def _emit(self, result: ProcessResult):
+        # Kept after a time limit (e.g. the truncated result of the file it ended), dropped when stopped or when the
+        # limit of matches was reached (parallel mode: results of the chunks still running)
+        max_matches = self._options.max_matches
+        if self.stopped() or (max_matches and self._found >= max_matches):
+            return
+
+        # Ranked: only the best results are kept until the end
+        if self._top is not None:
+            self._top.add(result)
         else:
+            self._put(result)
+        self._found += 1
+
+        if max_matches and self._found >= max_matches:
+            self.stats.truncated = f"limit of {max_matches} matches reached"
+
+    def _searched(self, file: str, result: ProcessResult):
+        """ Handle the result of a file (None when it did not match), also for the other paths of the file """
+        if result is not None:
+            self._emit(result)
+
+        if self._duplicates is not None:
+            self._duplicates.searched(file, result)
+            self._emit_aliases()
+
+    def _emit_aliases(self):
+        query = Query.compile(self._txt, self._options.mode, self._options.max_errors)
+
+        for alias, result in self._duplicates.take_ready():
+            if self._halted():
+                return
+
+            path_found = query.in_path(alias)
+            if result is None:
+                # Same content without a hit: only the path of the alias can match, it is searched like any other file
+                if path_found:
+                    alias_result = self._process_file(alias)
+                    if alias_result is not None:
+                        self._emit(alias_result)
+                continue
+
+            alias_result = result.for_path(alias, path_found)
+            if alias_result is not None:
+                # A copy of the content has a modification time of its own
+                stat = _stat(alias)
+                alias_result.mtime = stat.st_mtime if stat is not None else 0.0
+                alias_result.score = ranking.score(alias_result, query, stat.st_size if stat is not None else ranking.REFERENCE_SIZE)
+                self.stats.add_result(alias_result)
+                self._emit(alias_result)
+
+    def _put_ranked(self):
+        # Also when a limit ended the search: the best of the results found so far
+        for result in self._top.results():
+            self._put(result)
+
+        if self._top.dropped and not self.stats.truncated:
+            self.stats.truncated = f"best {self._top.k} of {self._top.added} matches kept"
+
+    def _put(self, result: ProcessResult):
+        # The queue can be bounded: wait for free space, but keep checking for STOP
+        with self.stats.phase("queue"):
+            while not self.stopped():
+                try:
+                    self._q.put(result, timeout = PyProcessExecutor.POLL_INTERVAL)
+                    return
+                except queue.Full:
+                    pass
+
+    def _find_files(self) -> Iterable[str]:
+        # Every file is searched once, whatever the number of paths pointing to it
+        if self._files is not None:
+            return self._duplicates.unique(self._files) if self._duplicates is not None else self._files
+
+        # Files are enumerated in a separate thread, the search can start as soon as the first file is found. The walker
+        # also collapses the paths, so that stays off the critical path
+        rules = IgnoreRules.create(self._options.exclude, self._options.max_size, self._options.gitignore)
+        self._walker = FileWalker(self._path, self._file_type, self._halted, self._options.archives, rules, self._duplicates)
+        return self._walker
+
+    def _filter_indexed(self, files: Iterable[str]) -> list[str]:
+        # The index needs the complete list of files to detect deleted files
+        files = list(files)
+        if self.stopped(): # Handle STOP
             return None
+
+        try:
+            index = TrigramIndex(self._path)
+            try:
+                # Only files that changed since the previous search are read again
+                if not index.update(files, self.stopped):
+                    return None
+
+                candidates = index.query_candidates(Query.compile(self._txt, self._options.mode, self._options.max_errors))
+            finally:
+                index.close()
+        except (sqlite3.Error, OSError) as e:
+            # E.g. "database is locked" while another process updates the same index: search without it
+            self.logger.error(f"Index of [{self._path}] not used: {e}")
+            return files
+
+        if candidates is None:
+            return files
+
+        # Archives are not indexed, they are always searched
+        kept = []
+        for file in files:
+            if file in candidates or archive_reader.is_archived(file):
+                kept.append(file)
+            elif self._duplicates is not None:
+                # No hit in the content: the other paths of the file can only match with their path
+                self._duplicates.searched(file, None)
+        return kept
+
+    def _read_ahead(self, files: Iterable[str]) -> ReadAhead:
+        # Files of which the cache has the result are only stat'ed
+        skip = None
+        if self._cache is not None:
+            skip = lambda file, stat: self._cache.contains(file, stat, self._cache_key())
+
+        return ReadAhead(files, self._options.read_ahead, self._options.read_ahead_bytes, self._halted, skip, self._options.skip_binary)
+
+    def _workers(self) -> int:
+        # 0 means: use all available cores
+        return self._options.workers or os.cpu_count() or 1
+
+    def _run_parallel(self, files: Iterable[str]) -> bool:
+        """ Spread the files over a pool of worker processes
+
+            Files are handed out in chunks of roughly CHUNK_BYTES, so every worker gets about the same amount of data
+            to read. Results are put on the queue as soon as a chunk is finished.
+
+            Returns False when the search was stopped (True when it ended because of a limit: the results of the chunks
+            running at that moment are still collected).
+        """
+        workers = self._workers()
+        stop_event = multiprocessing.Event()
+
+        # Forward log records of the workers to the handlers of this process
+        log_queue = multiprocessing.Queue()
+        listener = logging.handlers.QueueListener(log_queue, *logging.getLogger().handlers, respect_handler_level = True)
+        listener.start()
+
+        pool = ProcessPoolExecutor(max_workers = workers, initializer = _init_worker, initargs = (stop_event, log_queue, logging.getLogger().level))
+        pending = set()
+        try:
+            for chunk in _chunk_by_size(self._cache_misses(files), PyProcessExecutor.CHUNK_BYTES, PyProcessExecutor.CHUNK_FILES):
+                # Limit the number of submitted chunks, so STOP does not have to cancel a large backlog
+                while len(pending) >= workers * 2:
+                    pending = self._collect(pending)
+                    if self._halted(): # Handle STOP and limits
+                        return self._finish(pending, stop_event)
+
+                pending.add(pool.submit(_search_chunk, chunk, self._txt, self._options))
+
+            while pending:
+                pending = self._collect(pending)
+                if self._halted(): # Handle STOP and limits
+                    return self._finish(pending, stop_event)
+        finally:
+            # Stopped: do not wait for running chunks (they check 'stop_event' between files). Otherwise all chunks are
+            # done: wait for the workers to exit, so the pool is not torn down while the interpreter exits
+            pool.shutdown(wait = not self.stopped(), cancel_futures = True)
+            listener.stop()
+
+        return True
+
+    def _finish(self, pending: set, stop_event: multiprocessing.Event) -> bool:
+        """ End the chunks of a search that is stopped or reached a limit, returns False when stopped """
+        stop_event.set()
+
+        # Limit: the running chunks end at their next check for STOP, their (partly) searched files are kept
+        pending = {future for future in pending if not future.cancel()}
+        while pending and not self.stopped():
+            pending = self._collect(pending)
+
+        return not self.stopped()
+
+    def _collect(self, pending: set) -> set:
+        done, pending = wait(pending, timeout = PyProcessExecutor.POLL_INTERVAL, return_when = FIRST_COMPLETED)
+
+        for future in done:
+            results, stats = future.result()
+            self.stats.merge(stats)
+
+            for file, result in results:
+                # The search of the file may have ended early
+                stat = self._file_stats.pop(file, None)
+                if stat is not None and not self._halted():
+                    self._cache.put(file, stat, self._cache_key(), result)
+
+                self._searched(file, result)
+
+        return pending
+
+    def _cache_misses(self, files: Iterable[str]) -> Iterator[str]:
+        """ Parallel mode: put cached results on the queue right away, only yield the files which have to be searched """
+        for file in files:
+            if self._cache is None:
+                yield file
+                continue
+
+            try:
+                stat = archive_reader.stat(file)
+            except OSError:
+                yield file  # Reported by the worker when it tries to open the file
+                continue
+
+            hit, result = self._cache.get(file, stat, self._cache_key())
+            if hit:
+                self.stats.cached += 1
+                self.stats.add_result(result)
+                self._searched(file, result)
+            else:
+                self._file_stats[file] = stat
+                yield file
+
+    def _cache_key(self) -> tuple:
+        # Everything apart from the file which determines the result
+        return (self._txt, self._options.mode, self._options.max_errors, self._options.engine, self._options.max_lines,
+                self._options.archives, self._options.skip_binary)
+
+    def _process_file(self, file: str, stat: os.stat_result = None, data: bytes = None) -> ProcessResult:
+        """ Search a file, 'stat' and 'data' are given when the file was read ahead """
+        try:
+            return self._search_file(file, stat, data)
+        except archive_reader.ERRORS as e:
+            # E.g. deleted after it was listed, or a damaged archive: log and continue with the rest
+            self.logger.error(f"Error while reading file [{file}]: {e}")
+            return None
+
+    def _search_file(self, file: str, stat: os.stat_result, data: bytes) -> ProcessResult:
+        if self._cache is None:
+            return file_matcher.search_file(file, self._txt, self._options, self.logger, self.stats, data, stat, self._halted)
+
+        # Consult the cache before touching the content of the file
+        if stat is None:
+            stat = archive_reader.stat(file)
+        hit, result = self._cache.get(file, stat, self._cache_key())
+        if hit:
+            self.stats.cached += 1
+            self.stats.add_result(result)
+        else:
+            result = file_matcher.search_file(file, self._txt, self._options, self.logger, self.stats, data, stat, self._halted)
+
+            # The search of the file may have ended early
+            if not self._halted():
+                self._cache.put(file, stat, self._cache_key(), result)
+
+        return result
+
+
+# Worker process state, set by '_init_worker'
+_worker_stop_event = None
+
+def _init_worker(stop_event: multiprocessing.Event, log_queue: multiprocessing.Queue, log_level: int):
+    global _worker_stop_event
+    _worker_stop_event = stop_event
+
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(log_level)
+
+def _search_chunk(files: list[str], search_param: str, options: SearchOptions) -> tuple[list[tuple[str, ProcessResult]], SearchStats]:
+    """ Search a chunk of files in a worker process, returns (file, result) for every searched file and the stats """
+    logger = logging.getLogger(__name__)
+    stats = SearchStats()
+    results = []
+
+    for file in files:
+        if _worker_stop_event.is_set(): # Handle STOP
+            break
+
+        try:
+            result = file_matcher.search_file(file, search_param, options, logger, stats, stopped = _worker_stop_event.is_set)
+        except archive_reader.ERRORS as e:
+            # E.g. deleted after it was listed, or a damaged archive: log and continue with the rest
+            logger.error(f"Error while reading file [{file}]: {e}")
+            continue
+
+        # Stopped while searching the file: the result may be truncated, the executor decides whether it is used
+        results.append((file, result))
+        if _worker_stop_event.is_set():
+            break
+
+    return (results, stats)
+
+def _stat(file: str) -> os.stat_result:
+    try:
+        return archive_reader.stat(file)
+    except OSError:
+        return None
+
+def _chunk_by_size(files: Iterable[str], chunk_bytes: int, chunk_files: int) -> Iterator[list[str]]:
+    """ Group files into chunks of about 'chunk_bytes' (large files get a chunk of their own)
+
+        The members of an archive are counted as the size of the archive, once: they are spread over several chunks
+        (of at most 'chunk_files'), so a large archive is searched by several workers.
+    """
+    chunk = []
+    size = 0
+    counted = None
+
+    for file in files:
+        path = archive_reader.container(file)
+        if path != counted:
+            try:
+                size += os.stat(path).st_size
+            except OSError:
+                pass    # Reported by the worker when it tries to open the file
+            counted = path
+
+        chunk.append(file)
+        if size >= chunk_bytes or len(chunk) >= chunk_files:
+            yield chunk
+            chunk = []
+            size = 0
+
+    if chunk:
+        yield chunk
@@ -1,7 +1,238 @@
-from dataclasses import dataclass
+import os
+import threading
+import itertools
+from array import array
+from collections import OrderedDict
+from typing import Iterator
 
-@dataclass
 class ProcessResult:
-    """Class for keeping track of result"""
-    key: str            # holds filename + path
-    dat: list[str]      # holds a list of lines in which the pattern occurs
\ No newline at end of file
+    """Class for keeping track of result
+
+    Remarks:
+        A result is either 'compact' or holds the found text:
+            - compact: only the line number and the byte offset (start of the line) of every found line are kept in
+              arrays, about 12 bytes per line. The text ('dat') is read from the file when asked for. When the file
+              changed since the search, the offsets no longer fit: 'dat' then ends with a "<<file changed since the
+              search>>" entry instead of the found lines.
+            - text: 'dat' holds the found lines as strings (results of the line engine or built by hand)
+
+        'dat' has the same format in both cases: an optional "<<text found in path>>" entry followed by "N: line".
+
+        'spans' holds where the search text was found, as (found line, column, length) triples: 'found line' is the
+        position of the line among the found lines, 'column' counts characters in the text of the line (after "N: ").
+
+    Attributes:
+        key (str): holds filename + path
+        path_found (bool): the path contains the search text
+        linenumbers (array): compact: line number of every found line
+        offsets (array): compact: byte offset of every found line
+        mtime (float): modification time of the file when it was searched, 0 when unknown
+        spans (array): match spans (flat triples), None when not recorded
+        terms (tuple[str]): multi-term query: the terms found in the content, None otherwise
+        truncated (bool): not all found lines were kept (limit per file, or the search ended while searching the file)
+        score (float): relevance of the result (see ranking.score), higher is better
+        distance (int): fuzzy query: fewest edits of the hits in the content, None otherwise
+    Args:
+        key (str)
+        dat (list[str]): found text, None for a compact result
+    """
+
+    __slots__ = ("key", "path_found", "linenumbers", "offsets", "mtime", "spans", "terms", "truncated", "score", "distance", "_dat")
+
+    PATH_FOUND = "<<text found in path>>\n"
+    FILE_CHANGED = "<<file changed since the search>>\n"
+
+    def __init__(self, key: str, dat: list[str] = None):
+        self.key = key
+        self.path_found = False
+        self.linenumbers = None
+        self.offsets = None
+        self.mtime = 0.0
+        self.spans = None
+        self.terms = None
+        self.truncated = False
+        self.score = 0.0
+        self.distance = None
+        self._dat = dat
+
+    @classmethod
+    def compact(cls, key: str, path_found: bool, linenumbers: array, offsets: array, mtime: float = 0.0,
+                spans: array = None) -> "ProcessResult":
+        result = cls(key)
+        result.path_found = path_found
+        result.linenumbers = linenumbers
+        result.offsets = offsets
+        result.mtime = mtime
+        result.spans = spans
+        return result
+
+    @property
+    def dat(self) -> list[str]:
+        """ Holds a list of lines in which the pattern occurs (read from the file for a compact result) """
+        return self.head()
+
+    def head(self, count: int = None) -> list[str]:
+        """ The first 'count' entries of 'dat' (all when None), a compact result only reads those lines """
+        if self._dat is not None:
+            return self._dat if count is None else self._dat[:count]
+
+        found_text = [ProcessResult.PATH_FOUND] if self.path_found else []
+        if self.changed():
+            found_text.append(ProcessResult.FILE_CHANGED)
+            return found_text
+
+        limit = None if count is None else max(count - len(found_text), 0)
+        found_text.extend(f"{linenumber}: {line}" for linenumber, _, line in self.lines(limit))
+        return found_text
+
+    @property
+    def line_count(self) -> int:
+        """ Number of found lines (without the path entry), never reads the file """
+        if self._dat is not None:
+            return sum(1 for line in self._dat if line != ProcessResult.PATH_FOUND)
+        return len(self.linenumbers)
+
+    def is_compact(self) -> bool:
+        return self._dat is None
+
+    def changed(self) -> bool:
+        """ True when the file of a compact result was modified since it was searched (the mtime is 0 when not known)
+
+            Raises:
+                OSError: the file can't be stat'ed (e.g. deleted)
+        """
+        return self._dat is None and bool(self.mtime) and os.stat(self.key).st_mtime != self.mtime
+
+    def lines(self, limit: int = None) -> Iterator[tuple[int, int, str]]:
+        """ Yield (line number, byte offset, text) for every found line (the first 'limit' lines), the offset is -1 for a text result """
+        if self._dat is not None:
+            found = (line for line in self._dat if line != ProcessResult.PATH_FOUND)
+            for line in itertools.islice(found, limit):
+                colon = line.find(": ")
+                yield (int(line[:colon]), -1, line[colon + 2:])
+            return
+
+        with open(self.key, "rb") as reader:
+            for linenumber, offset in itertools.islice(zip(self.linenumbers, self.offsets), limit):
+                reader.seek(offset)
+                line = reader.readline().decode("utf8", errors = "replace").replace("\r\n", "\n")
+                yield (linenumber, offset, line)
+
+    def for_path(self, key: str, path_found: bool) -> "ProcessResult":
+        """ The same result for another path of the same content (a hard link or copy), None when that path does not match
+
+            The found lines and spans are shared, only the path entry follows 'path_found'. The score is copied as is.
+        """
+        if not path_found and self.line_count == 0:
+            return None
+
+        dat = None
+        if self._dat is not None:
+            dat = [ProcessResult.PATH_FOUND] if path_found else []
+            dat.extend(line for line in self._dat if line != ProcessResult.PATH_FOUND)
+
+        result = ProcessResult(key, dat)
+        result.path_found = path_found
+        result.linenumbers = self.linenumbers
+        result.offsets = self.offsets
+        result.mtime = self.mtime
+        result.spans = self.spans
+        result.terms = self.terms
+        result.truncated = self.truncated
+        result.score = self.score
+        result.distance = self.distance
+        return result
+
+    def approx_size(self) -> int:
+        """ Approx. memory used by the found lines and spans, in bytes """
+        size = self.spans.itemsize * len(self.spans) if self.spans is not None else 0
+        if self._dat is not None:
+            return size + sum(len(line) + 50 for line in self._dat)
+        return size + self.linenumbers.itemsize * len(self.linenumbers) + self.offsets.itemsize * len(self.offsets)
+
+    def to_dict(self) -> dict:
+        """ JSON compatible form, a compact result stays compact (the receiver reads the lines from the file) """
+        data = {"key": self.key, "path_found": self.path_found, "mtime": self.mtime, "terms": self.terms, "truncated": self.truncated,
+                "score": self.score, "distance": self.distance, "spans": self.spans.tolist() if self.spans is not None else None}
+        if self._dat is not None:
+            data["dat"] = self._dat
+        else:
+            data.update(linenumbers = self.linenumbers.tolist(), offsets = self.offsets.tolist())
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ProcessResult":
+        if "dat" in data:
+            result = cls(data["key"], data["dat"])
+            result.path_found = data["path_found"]
+        else:
+            result = cls.compact(data["key"], data["path_found"], array("I", data["linenumbers"]), array("Q", data["offsets"]))
+        result.mtime = data["mtime"]
+        result.terms = tuple(data["terms"]) if data["terms"] is not None else None
+        result.truncated = data["truncated"]
+        result.score = data["score"]
+        result.distance = data["distance"]
+        result.spans = array("I", data["spans"]) if data["spans"] is not None else None
+        return result
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ProcessResult):
+            return NotImplemented
+        return (self.key == other.key and self.path_found == other.path_found and self.linenumbers == other.linenumbers
+                and self.offsets == other.offsets and self._dat == other._dat)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        if self._dat is not None:
+            return f"ProcessResult(key={self.key!r}, dat={self._dat!r})"
+        return f"ProcessResult(key={self.key!r}, path_found={self.path_found}, lines={len(self.linenumbers)})"
+
+    def __getstate__(self):
+        return (self.key, self.path_found, self.linenumbers, self.offsets, self.mtime, self.spans, self.terms, self.truncated,
+                self.score, self.distance, self._dat)
+
+    def __setstate__(self, state):
+        (self.key, self.path_found, self.linenumbers, self.offsets, self.mtime, self.spans, self.terms, self.truncated,
+         self.score, self.distance, self._dat) = state
+
+
+class PreviewCache:
+    """ Small LRU of the text of recently previewed results
+
+    Attributes:
+        size (int): number of results kept
+        lines (int): max. number of entries of a result shown, None for all
+    Args:
+        size (int)
+        lines (int)
+    """
+    def __init__(self, size: int = 8, lines: int = None):
+        self.size = size
+        self.lines = lines
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, result: ProcessResult) -> list[str]:
+        if not result.is_compact():
+            return result.head(self.lines)
+
+        # The result itself is kept in the entry, so its id can't be reused while cached
+        with self._lock:
+            entry = self._entries.get(id(result))
+            if entry is not None:
+                self._entries.move_to_end(id(result))
+                return entry[1]
+
+        dat = result.head(self.lines)
+
+        with self._lock:
+            self._entries[id(result)] = (result, dat)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last = False)
+
+        return dat
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
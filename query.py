@@ -0,0 +1,210 @@
+import re
+import functools
+from typing import Callable
+
+from approximate import ApproximateMatcher
+
+class Query:
+    """ Compiled search text, shared by both engines and the refinement
+
+    Remarks:
+        Modes:
+            - text: the search text as a whole
+            - any: the search text is split on whitespace into terms, a line is found when it contains one of the terms
+            - all: like 'any', but a file is only a result when every term is found in it (or every term in its path)
+            - regex: the search text is a regular expression, matched per line
+            - fuzzy: the search text as a whole, with at most 'max_errors' edits (see ApproximateMatcher). The 'term' of
+              a hit is its number of edits.
+
+        Content is always matched case insensitive, on lowercased text. Multiple terms are combined into one compiled
+        regex (longest term first), so a file is scanned once however many terms there are. The byte engine does the
+        same on lowercased bytes (bytes.lower only folds ASCII: only for ASCII terms, and files holding one of the 2
+        non ASCII characters str.lower folds to ASCII are left to the line engine), but first checks per block which
+        terms occur at all with plain 'find', which is much faster than the regex: blocks without any term are skipped
+        and blocks with a single term are searched with 'find' as well.
+
+        Like before, the path is matched case sensitive (regex: case insensitive), and exactly.
+
+    Attributes:
+        text (str): search text as entered
+        mode (str): one of MODES
+        terms (list[str]): lowercased terms, a single one for 'text' and 'regex'
+        pattern (re.Pattern): pattern for lowercased text, None for 'text' (plain 'find' is faster)
+        matcher (ApproximateMatcher): fuzzy only
+    Args:
+        text (str)
+        mode (str)
+        max_errors (int): fuzzy only
+    Raises:
+        ValueError: no terms in 'text', unknown mode, a regular expression matching the empty string or 'text' too
+            short for 'max_errors'
+        re.error: invalid regular expression
+    """
+
+    MODES = ("text", "any", "all", "regex", "fuzzy")
+    # UTF-8 of the non ASCII characters that str.lower folds to an ASCII letter (KELVIN SIGN, LATIN CAPITAL LETTER I
+    # WITH DOT ABOVE), with that letter
+    UNFOLDED = ((b"\xe2\x84\xaa", "k"), (b"\xc4\xb0", "i"))
+
+    def __init__(self, text: str, mode: str = "text", max_errors: int = 1):
+        if mode not in Query.MODES:
+            raise ValueError(f"Unknown query mode [{mode}]")
+
+        self.text = text
+        self.mode = mode
+        self._path_terms = text.split() if mode in ("any", "all") else [text]
+        self._path_terms = list(dict.fromkeys(self._path_terms))
+        self.terms = [term.lower() for term in self._path_terms]
+        if len(self.terms) == 0 or self.terms == [""]:
+            raise ValueError("Nothing to search for")
+
+        self.pattern = None
+        self.matcher = None
+        self._term_index = {term: index for index, term in enumerate(self.terms)}
+        # A hit of a term is a hit of every term it contains as well, the regex only reports the longest one
+        self._covers = [{index for index, other in enumerate(self.terms) if other in term} for term in self.terms]
+        self._byte_terms = None
+        self._byte_patterns = {}
+        self._unfolded = ()
+
+        if mode == "regex":
+            self.pattern = re.compile(text, re.IGNORECASE)
+            # It would match every line and every path
+            if self.pattern.fullmatch("") is not None:
+                raise ValueError("The regular expression matches an empty text")
+        else:
+            if mode == "fuzzy":
+                self.matcher = ApproximateMatcher(self.terms[0], max_errors)
+            elif mode != "text":
+                self.pattern = re.compile(Query._alternatives(self.terms))
+            if all(term.isascii() for term in self.terms):
+                self._byte_terms = [term.encode("ascii") for term in self.terms]
+                # Fuzzy: the characters count as edits, whatever the letters of the term
+                self._unfolded = tuple(encoded for encoded, letter in Query.UNFOLDED
+                                       if mode == "fuzzy" or any(letter in term for term in self.terms))
+
+    @staticmethod
+    @functools.lru_cache(maxsize = 32)
+    def compile(text: str, mode: str = "text", max_errors: int = 1) -> "Query":
+        """ Cached constructor: every file (and every worker process) searches with the same compiled query """
+        return Query(text, mode, max_errors)
+
+    def bytes_supported(self) -> bool:
+        """ True when the byte engine gives the same result as the line engine (files it would lowercase differently are
+            left to the line engine, see 'unfolded')
+        """
+        return self._byte_terms is not None
+
+    def unfolded(self, data: bytes) -> bool:
+        """ True when 'data' holds a character that str.lower folds to a letter of the terms and bytes.lower does not
+
+            Only when 'bytes_supported'.
+        """
+        return any(data.find(encoded) != -1 for encoded in self._unfolded)
+
+    def in_path(self, path: str) -> bool:
+        if self.mode == "regex":
+            return self.pattern.search(path) is not None
+        if self.mode == "all":
+            return all(path.find(term) != -1 for term in self._path_terms)
+        return any(path.find(term) != -1 for term in self._path_terms)
+
+    def find(self, lowered: str, start: int, end: int = None) -> tuple[int, int, int]:
+        """ First hit in lowercased text: (position, length, term index), position -1 when not found """
+        if self.matcher is not None:
+            return self.matcher.find(lowered, start, len(lowered) if end is None else end)
+        if self.pattern is None:
+            return (lowered.find(self.terms[0], start, end), len(self.terms[0]), 0)
+
+        match = self.pattern.search(lowered, start, len(lowered) if end is None else end)
+        if match is None:
+            return (-1, 0, 0)
+        return (match.start(), match.end() - match.start(), self._term_index.get(match.group(), 0))
+
+    def block_finder(self, lowered: bytes) -> Callable[[int, int], tuple[int, int, int]]:
+        """ Same as 'find' for a block of lowercased bytes: returns find(start, end), None when no term occurs in the block
+
+            Only when 'bytes_supported'.
+        """
+        if self.matcher is not None:
+            return self._approximate_finder(lowered)
+        if len(self._byte_terms) == 1:
+            return Query._literal_finder(lowered, self._byte_terms[0], 0)
+
+        present = tuple(index for index, term in enumerate(self._byte_terms) if lowered.find(term) != -1)
+        if len(present) == 0:
+            return None
+        if len(present) == 1:
+            return Query._literal_finder(lowered, self._byte_terms[present[0]], present[0])
+
+        pattern = self._byte_patterns.get(present)
+        if pattern is None:
+            pattern = re.compile(Query._alternatives([self.terms[index] for index in present]).encode("ascii"))
+            self._byte_patterns[present] = pattern
+
+        def find(start: int, end: int = None) -> tuple[int, int, int]:
+            match = pattern.search(lowered, start, len(lowered) if end is None else end)
+            if match is None:
+                return (-1, 0, 0)
+            return (match.start(), match.end() - match.start(), self._term_index[match.group().decode("ascii")])
+        return find
+
+    def accepts(self, found_terms: set[int]) -> bool:
+        """ True when the terms found in the content (term indexes) make the file a result """
+        if self.mode == "all":
+            return len(self._covered(found_terms)) == len(self.terms)
+        return len(found_terms) > 0
+
+    def matched_terms(self, found_terms: set[int]) -> tuple[str]:
+        """ The terms found in the content, in the order of the search text """
+        covered = self._covered(found_terms)
+        return tuple(term for index, term in enumerate(self.terms) if index in covered)
+
+    @staticmethod
+    def _alternatives(terms: list[str]) -> str:
+        # Longest term first, so a term is not cut short by a term it starts with
+        return "|".join(re.escape(term) for term in sorted(terms, key = len, reverse = True))
+
+    @staticmethod
+    def _literal_finder(lowered: bytes, term: bytes, index: int) -> Callable[[int, int], tuple[int, int, int]]:
+        def find(start: int, end: int = None) -> tuple[int, int, int]:
+            return (lowered.find(term, start, end), len(term), index)
+        return find
+
+    def _approximate_finder(self, lowered: bytes) -> Callable[[int, int], tuple[int, int, int]]:
+        if not self.matcher.occurs(lowered):
+            return None
+
+        def find(start: int, end: int = None) -> tuple[int, int, int]:
+            # Per line with a candidate: edits are counted in characters, so lines with non ASCII characters are decoded
+            end = len(lowered) if end is None else end
+            pos = start
+            while True:
+                pos = self.matcher.candidate(lowered, pos, end)
+                if pos == -1:
+                    return (-1, 0, 0)
+
+                line_start = max(lowered.rfind(b"\n", start, pos) + 1, start)
+                line_end = lowered.find(b"\n", pos, end)
+                line_end = end if line_end == -1 else line_end
+
+                line = lowered[line_start:line_end]
+                if line.isascii():
+                    hit, length, edits = self.matcher.find(lowered, line_start, line_end)
+                    if hit != -1:
+                        return (hit, length, edits)
+                else:
+                    text = line.decode("utf8", errors = "replace")
+                    hit, length, edits = self.matcher.find(text)
+                    if hit != -1:
+                        offset = line_start + len(text[:hit].encode("utf8"))
+                        return (offset, len(text[hit:hit + length].encode("utf8")), edits)
+
+                pos = line_end + 1
+        return find
+
+    def _covered(self, found_terms: set[int]) -> set[int]:
+        covered = set()
+        for index in found_terms:
+            covered |= self._covers[index]
+        return covered
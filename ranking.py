@@ -0,0 +1,87 @@
+import heapq
+import itertools
+import os
+
+from process_result import ProcessResult
+from query import Query
+
+K1 = 1.2                    # Saturation of the hit count: the 10th hit in a file adds much less than the 1st
+B = 0.75                    # Weight of the file size: the same number of hits in a smaller file is a denser match
+REFERENCE_SIZE = 16 << 10   # File size (bytes) of which the hit count is taken as is
+PATH_WEIGHT = 1.0           # Bonus when the path contains the search text
+NAME_WEIGHT = 2.0           # Extra bonus when the file name itself contains the search text
+
+def score(result: ProcessResult, query: Query, size: int) -> float:
+    """ Relevance of a result, higher is better
+
+        Computed from what the search already collected, the file is not read again:
+            - hits: the number of match spans (the number of found lines when no spans were recorded), saturated like
+              the term frequency of BM25 and normalized by the size of the file (match density)
+            - coverage: the share of the terms found in the content (multi-term queries)
+            - edits: a fuzzy result counts less the more edits its closest hit needs
+            - path / file name hits: the search text (one of the terms) in the path, more so in the file name
+
+        Args:
+            result (ProcessResult)
+            query (Query)
+            size (int): size of the file in bytes
+    """
+    hits = len(result.spans) // 3 if result.spans else result.line_count
+    content = 0.0
+    if hits > 0:
+        norm = 1 - B + B * size / REFERENCE_SIZE
+        content = hits * (K1 + 1) / (hits + K1 * norm)
+
+        if result.terms is not None:
+            content *= len(result.terms) / len(query.terms)
+        if result.distance:
+            content /= 1 + result.distance
+
+    if result.path_found:
+        content += PATH_WEIGHT
+        if query.in_path(os.path.basename(result.key)):
+            content += NAME_WEIGHT
+
+    return content
+
+
+class TopResults:
+    """ The 'k' best results (by score) of all results added
+
+    Remarks:
+        Kept in a min heap of at most 'k' entries: every result added either replaces the worst one kept or is dropped
+        right away, so memory does not grow with the number of files found. Of results with the same score, the one
+        found first is kept.
+
+    Attributes:
+        k (int): number of results kept
+        added (int): number of results added
+    Args:
+        k (int)
+    """
+
+    def __init__(self, k: int):
+        self.k = k
+        self.added = 0
+        self._heap = []
+        self._sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    @property
+    def dropped(self) -> int:
+        return self.added - len(self._heap)
+
+    def add(self, result: ProcessResult):
+        self.added += 1
+        # The sequence number decides between equal scores (and results themselves are never compared)
+        entry = (result.score, -next(self._sequence), result)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+
+    def results(self) -> list[ProcessResult]:
+        """ The results kept, best first """
+        return [entry[2] for entry in sorted(self._heap, key = lambda entry: entry[:2], reverse = True)]
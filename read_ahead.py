@@ -0,0 +1,125 @@
+import os
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Callable, Iterable, Iterator
+
+import archive_reader
+import file_matcher
+
+class ReadAhead:
+    """ Read upcoming files with a few threads while the current file is searched
+
+    Remarks:
+        Meant for network filesystems, where every open and read waits for a round trip: with several requests in
+        flight the waits overlap instead of adding up. This is not about CPU parallelism (see 'workers'), the reads
+        release the GIL.
+
+        Files are handed out in the order they came in. At most 'DEPTH_PER_THREAD' files per thread are in flight, and
+        only files up to 'max_bytes' / (in flight + 1) are read in advance: the pipeline is filled again while the
+        consumer still holds the previous file, so the data held never exceeds 'max_bytes'.
+        Larger files are only stat'ed, the matcher reads (or memory maps) those itself. Members of zip archives are only
+        stat'ed as well (the stat of the archive).
+
+        'skip' is called with the stat of every file (in the reading thread), when it returns True the content is not
+        read: used for files of which the cache already has the result.
+
+        With 'sniff', only the first block of a file is read at first: a file with binary content (see
+        file_matcher.is_binary) is not read any further, the matcher skips it after the same check. Compressed files are
+        not sniffed, their content is only known after decompression.
+
+    Attributes:
+        threads (int): number of reading threads
+        max_bytes (int): memory budget of the files read in advance
+        max_file (int): larger files are not read in advance
+        waited (float): seconds the consumer had to wait for a file
+        logger (Logger)
+    Args:
+        files (Iterable[str])
+        threads (int)
+        max_bytes (int)
+        stopped (Callable[[], bool])
+        skip (Callable[[str, os.stat_result], bool])
+        sniff (bool): skip_binary: binary files are not read in advance
+    """
+
+    DEPTH_PER_THREAD = 2
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, files: Iterable[str], threads: int, max_bytes: int, stopped: Callable[[], bool],
+                 skip: Callable[[str, os.stat_result], bool] = None, sniff: bool = False):
+        self._files = files
+        self._stopped = stopped
+        self._skip = skip
+        self._sniff = sniff
+        self.threads = max(threads, 1)
+        self.max_bytes = max_bytes
+        self.max_file = max_bytes // (self.threads * ReadAhead.DEPTH_PER_THREAD + 1)
+        self.waited = 0.0
+
+        # Logging config
+        self.logger = logging.getLogger(__name__)
+
+    def __iter__(self) -> Iterator[tuple[str, os.stat_result, bytes]]:
+        """ Yield (file, stat, content) in the original order, stat is None when the file can't be opened and content
+            is None when it was not read in advance
+        """
+        depth = self.threads * ReadAhead.DEPTH_PER_THREAD
+        pool = ThreadPoolExecutor(max_workers = self.threads, thread_name_prefix = "ReadAhead")
+        pending = deque()
+        files = iter(self._files)
+
+        try:
+            while True:
+                # Keep the pipeline filled
+                while len(pending) < depth:
+                    file = next(files, None)
+                    if file is None:
+                        break
+                    pending.append(pool.submit(self._load, file))
+
+                if not pending:
+                    return
+
+                start = time.perf_counter()
+                while True:
+                    if self._stopped(): # Handle STOP
+                        return
+                    try:
+                        loaded = pending[0].result(timeout = ReadAhead.POLL_INTERVAL)
+                        break
+                    except TimeoutError:
+                        pass
+                self.waited += time.perf_counter() - start
+
+                pending.popleft()
+                yield loaded
+        finally:
+            # Do not wait for reads in progress
+            pool.shutdown(wait = False, cancel_futures = True)
+
+    def _load(self, file: str) -> tuple[str, os.stat_result, bytes]:
+        if self._stopped(): # Handle STOP
+            return (file, None, None)
+
+        try:
+            archive, member = archive_reader.split(file)
+            if member is not None:
+                return (file, os.stat(archive), None)
+
+            with open(file, "rb") as reader:
+                stat = os.fstat(reader.fileno())
+                if stat.st_size > self.max_file or (self._skip is not None and self._skip(file, stat)):
+                    return (file, stat, None)
+
+                if self._sniff and not archive_reader.is_archived(file):
+                    head = reader.read(file_matcher.SNIFF_BYTES)
+                    if file_matcher.is_binary(head):
+                        return (file, stat, None)
+                    return (file, stat, head + reader.read())
+                return (file, stat, reader.read())
+        except OSError as e:
+            # Reported by the matcher when it tries to open the file
+            self.logger.debug(f"Read ahead of [{file}] failed: {e}")
+            return (file, None, None)
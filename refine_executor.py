@@ -0,0 +1,168 @@
+import os
+import time
+import queue
+import logging
+import threading
+from array import array
+
+import file_matcher
+import ranking
+from process_executor import PyProcessExecutor
+from process_result import ProcessResult
+from query import Query
+from search_options import SearchOptions
+from search_stats import SearchStats
+
+class PyRefineExecutor(threading.Thread):
+    """ Narrow the results of a previous search down to a new search text, in a separate Thread
+
+    Remarks:
+        When the previous search text is part of the new one, every line containing the new text also contains the
+        previous text. The new results are therefore a subset of the previous ones: only the lines kept in the previous
+        results are searched again. For compact results only those lines are read from the files: a file changed since
+        it was searched (other mtime) is searched again as a whole, its stored offsets no longer point to those lines.
+
+        Uses the same protocol as PyProcessExecutor: results are put on the queue, followed by the SENTINEL.
+
+    Attributes:
+        _source (list[ProcessResult]): results of the previous search
+        _txt (str): text to search for
+        _q (queue.Queue): Object to share 'Thread-safe' data between threads
+        _options (SearchOptions): options of the previous search, used for files searched again
+        _stop_event (threading.Event): used to indicate thread should be stopped
+        stats (SearchStats): timings and counters of the refinement
+        logger (Logger)
+    Args:
+        source (list[ProcessResult])
+        txt (str)
+        q (queue.Queue)
+        options (SearchOptions)
+    """
+
+    def __init__(self, source: list[ProcessResult], txt: str, q: queue.Queue, options: SearchOptions = None):
+        super(PyRefineExecutor, self).__init__(daemon = True)
+
+        self._source = source
+        self._txt = txt
+
+        self._q = q
+        self._options = options if options is not None else SearchOptions()
+        self._stop_event = threading.Event()
+        self.stats = SearchStats()
+
+        # Logging config
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def is_refinement(previous: tuple, current: tuple) -> bool:
+        """ True when the results of search input 'current' are a subset of the results of 'previous'
+
+            Args:
+                previous (tuple): path, file types, text and (optional) query mode and 'options_key' of the previous search
+                current (tuple): path, file types, text and (optional) query mode and 'options_key' of the new search
+        """
+        # Containment only holds for plain text searches
+        mode = current[3] if len(current) > 3 else "text"
+        if mode != "text" or previous[3:] != current[3:]:
+            return False
+
+        # Case sensitive containment: the path check of the executor is case sensitive
+        return previous[0] == current[0] and previous[1] == current[1] and previous[2] in current[2]
+
+    @staticmethod
+    def options_key(options: SearchOptions) -> tuple:
+        """ The options which change which files and lines are found: results are only refined when these are the same """
+        return (options.archives, options.exclude, options.gitignore, options.max_size, options.skip_binary, options.dedup,
+                options.dedup_content, options.top_k)
+
+    def run(self):
+        start = time.perf_counter()
+
+        for result in self._source:
+            if self.stopped(): # Handle STOP
+                return
+
+            with self.stats.phase("match"):
+                refined = self._refine(result)
+            self.stats.files += 1
+            self.stats.add_result(refined)
+
+            if refined is not None:
+                self._put(refined)
+
+        self.stats.wall = time.perf_counter() - start
+        self.logger.info(f"Refine to [{self._txt}]: {self.stats.summary()}")
+
+        # Indicate end of result
+        self._put(PyProcessExecutor.SENTINEL)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def stopped(self):
+        return self._stop_event.is_set()
+
+    def _put(self, result: ProcessResult):
+        # The queue can be bounded: wait for free space, but keep checking for STOP
+        with self.stats.phase("queue"):
+            while not self.stopped():
+                try:
+                    self._q.put(result, timeout = PyProcessExecutor.POLL_INTERVAL)
+                    return
+                except queue.Full:
+                    pass
+
+    def _refine(self, result: ProcessResult) -> ProcessResult:
+        if result.is_compact() and self._changed(result):
+            return self._search_again(result)
+
+        query = Query.compile(self._txt)
+        path_found = query.in_path(result.key)
+
+        # Only search the text of the line, not the line number in front of it ("N: line")
+        spans = array("I")
+        found = []
+        try:
+            for linenumber, offset, line in result.lines():
+                if file_matcher.line_spans(line, query, len(found), spans, set()):
+                    found.append((linenumber, offset, line))
+        except OSError as e:
+            self.logger.error(f"Error while reading file [{result.key}]: {e}")
+            found = []
+            spans = array("I")
+
+        if not path_found and len(found) == 0:
+            return None
+
+        if result.is_compact():
+            refined = ProcessResult.compact(result.key, path_found, array("I", (entry[0] for entry in found)),
+                                            array("Q", (entry[1] for entry in found)), result.mtime, spans)
+        else:
+            found_text = [ProcessResult.PATH_FOUND] if path_found else []
+            found_text.extend(f"{linenumber}: {line}" for linenumber, _, line in found)
+            refined = ProcessResult(result.key, found_text)
+            refined.path_found = path_found
+            refined.mtime = result.mtime
+            refined.spans = spans
+
+        # Results built by hand may not have a file
+        try:
+            size = os.path.getsize(result.key)
+        except OSError:
+            size = ranking.REFERENCE_SIZE
+        refined.score = ranking.score(refined, query, size)
+        return refined
+
+    def _changed(self, result: ProcessResult) -> bool:
+        try:
+            return result.changed()
+        except OSError:
+            return True
+
+    def _search_again(self, result: ProcessResult) -> ProcessResult:
+        try:
+            return file_matcher.search_file(result.key, self._txt, self._options, self.logger)
+        except OSError as e:
+            # E.g. deleted since the previous search
+            self.logger.error(f"Error while reading file [{result.key}]: {e}")
+            return None
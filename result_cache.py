@@ -0,0 +1,102 @@
+import os
+import threading
+from collections import OrderedDict
+
+from process_result import ProcessResult
+
+class ResultCache:
+    """ LRU cache for the search result of a file, shared between searches
+
+    Remarks:
+        An entry is stored per file and query, together with the mtime and size of the file at the moment it was
+        searched. When the file changed since, the entry is dropped and counted as a miss. Files without a match are
+        cached as well (result None): for most queries these are the majority of the files.
+
+        The size of an entry is estimated from the length of the path and the found lines (a compact result only
+        takes a few bytes per line), entries are evicted (least recently used first) when the total exceeds 'max_bytes'.
+
+    Attributes:
+        max_bytes (int): memory budget
+        size_bytes (int): estimated memory used by the cached entries
+        hits (int)
+        misses (int)
+        invalidations (int): entries dropped because the file changed
+        evictions (int): entries dropped because of the memory budget
+    Args:
+        max_bytes (int)
+    """
+
+    ENTRY_OVERHEAD = 200    # Approx. bytes used by an entry, apart from the strings it holds
+
+    def __init__(self, max_bytes: int = 64 << 20):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, file: str, stat: os.stat_result, query: tuple) -> tuple[bool, ProcessResult]:
+        """ Return (True, result) when a valid entry is found, (False, None) otherwise """
+        key = (file, query)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return (False, None)
+
+            mtime, size, result, cost = entry
+            if mtime != stat.st_mtime_ns or size != stat.st_size:
+                del self._entries[key]
+                self.size_bytes -= cost
+                self.invalidations += 1
+                self.misses += 1
+                return (False, None)
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return (True, result)
+
+    def contains(self, file: str, stat: os.stat_result, query: tuple) -> bool:
+        """ True when a valid entry is found, without counting it or changing its LRU position """
+        with self._lock:
+            entry = self._entries.get((file, query))
+            return entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size
+
+    def put(self, file: str, stat: os.stat_result, query: tuple, result: ProcessResult):
+        key = (file, query)
+        cost = ResultCache.ENTRY_OVERHEAD + len(file)
+        if result is not None:
+            cost += result.approx_size()
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size_bytes -= previous[3]
+
+            # Don't let a single huge result flush the whole cache
+            if cost > self.max_bytes // 4:
+                return
+
+            self._entries[key] = (stat.st_mtime_ns, stat.st_size, result, cost)
+            self.size_bytes += cost
+
+            while self.size_bytes > self.max_bytes:
+                _, (_, _, _, evicted) = self._entries.popitem(last = False)
+                self.size_bytes -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "size_bytes": self.size_bytes, "max_bytes": self.max_bytes, "hits": self.hits,
+                    "misses": self.misses, "invalidations": self.invalidations, "evictions": self.evictions}
@@ -0,0 +1,88 @@
+from array import array
+
+from process_result import ProcessResult
+
+class ResultsModel:
+    """ Results of a search in display order, with precomputed sort keys
+
+    Remarks:
+        A result is identified by its index in 'results' (used as item id in the TreeView), so looking up the selected
+        result does not depend on the number of results. 'order' holds the indexes in display order.
+
+        The sort keys are computed once, when a result is added. While a sort is active, results which come in later
+        are inserted at their sorted position (binary search), so the order never has to be rebuilt.
+
+    Attributes:
+        results (list[ProcessResult]): all results, in the order they were found
+        order (list[int]): indexes into 'results' in display order
+        sort_column (str): column the results are sorted on, None when in the order they were found
+        sort_reverse (bool)
+    Args:
+        results (list[ProcessResult]): list to add the results to
+    """
+
+    COLUMNS = ("path", "matches", "modified", "score")
+
+    def __init__(self, results: list[ProcessResult]):
+        self.results = results
+        self.order = []
+        self.sort_column = None
+        self.sort_reverse = False
+        self._keys = {"path": [], "matches": array("I"), "modified": array("d"), "score": array("d")}
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    def clear(self):
+        self.results.clear()
+        self.order.clear()
+        self.sort_column = None
+        self.sort_reverse = False
+        for keys in self._keys.values():
+            del keys[:]
+
+    def add(self, result: ProcessResult) -> int:
+        """ Add a result, returns its position in the display order """
+        index = len(self.results)
+        self.results.append(result)
+        self._keys["path"].append(result.key)
+        self._keys["matches"].append(result.line_count)
+        self._keys["modified"].append(result.mtime)
+        self._keys["score"].append(result.score)
+
+        if self.sort_column is None:
+            self.order.append(index)
+            return index
+
+        position = self._bisect(index)
+        self.order.insert(position, index)
+        return position
+
+    def get(self, index: int) -> ProcessResult:
+        return self.results[index]
+
+    def page(self, start: int, count: int) -> list[int]:
+        """ Indexes of the results at display positions start .. start + count """
+        return self.order[start:start + count]
+
+    def sort(self, column: str, reverse: bool):
+        keys = self._keys[column]
+        self.order.sort(key = keys.__getitem__, reverse = reverse)
+        self.sort_column = column
+        self.sort_reverse = reverse
+
+    def _bisect(self, index: int) -> int:
+        # Position after the last result with the same key, like a stable sort would give
+        keys = self._keys[self.sort_column]
+        key = keys[index]
+
+        low, high = 0, len(self.order)
+        while low < high:
+            middle = (low + high) // 2
+            other = keys[self.order[middle]]
+            before = (other < key) if self.sort_reverse else (key < other)
+            if before:
+                high = middle
+            else:
+                low = middle + 1
+        return low
@@ -0,0 +1,56 @@
+import queue
+from typing import Iterator
+
+from daemon_executor import PyDaemonExecutor
+from process_executor import PyProcessExecutor
+from process_result import ProcessResult
+from result_cache import ResultCache
+from search_options import SearchOptions
+from search_stats import SearchStats
+
+QUEUE_SIZE = 2000
+
+def search(path: str, file_types: str, text: str, options: SearchOptions = None, cache: ResultCache = None,
+           stats: SearchStats = None, files: list[str] = None, daemon: bool = False) -> Iterator[ProcessResult]:
+    """ Search for text in files without a GUI, results are yielded as soon as they are found
+
+        Stopping the iteration (or closing the generator) stops the search.
+
+        Args:
+            path (str): directory to search in (recursively)
+            file_types (str): comma separated file type patterns, e.g. '*.md,*.txt'
+            text (str): text to search for (case insensitive)
+            options (SearchOptions)
+            cache (ResultCache): reuse results of previous searches
+            stats (SearchStats): receives the timings and counters of the search when it is done
+            files (list[str]): search these files instead of walking 'path'
+            daemon (bool): let the search daemon do the search when it is running ('files' is not used then, 'cache' only
+                when the daemon fails)
+    """
+    q = queue.Queue(maxsize = QUEUE_SIZE)
+    input = (path, file_types, text)
+
+    executor = PyDaemonExecutor.connect(input, q, options, cache) if daemon else None
+    if executor is None:
+        executor = PyProcessExecutor(input, q, options, cache, files)
+    executor.start()
+
+    try:
+        while True:
+            try:
+                result = q.get(timeout = PyProcessExecutor.POLL_INTERVAL)
+            except queue.Empty:
+                # Thread ended without 'Sentinel' result
+                if not executor.is_alive() and q.empty():
+                    raise RuntimeError(f"Search in [{path}] failed, see the log for details")
+                continue
+
+            if result == PyProcessExecutor.SENTINEL:
+                if stats is not None:
+                    stats.merge(executor.stats)
+                    stats.wall = executor.stats.wall
+                return
+
+            yield result
+    finally:
+        executor.stop()
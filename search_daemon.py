@@ -0,0 +1,262 @@
+import re
+import sys
+import hmac
+import json
+import time
+import sqlite3
+import logging
+import signal
+import secrets
+import argparse
+import threading
+import contextlib
+import socketserver
+from typing import Callable
+
+import search_api
+from daemon_executor import ENDPOINT_FILE, HOST, remove_endpoint, write_endpoint
+from file_walker import FileWalker
+from ignore_rules import IgnoreRules
+from query import Query
+from result_cache import ResultCache
+from search_options import SearchOptions
+from search_stats import SearchStats
+from trigram_index import TrigramIndex
+
+class SearchDaemon(socketserver.ThreadingTCPServer):
+    """ Long running search service, keeps file listings, results and indexes warm for all its clients
+
+    Remarks:
+        Protocol: JSON lines over a local TCP connection. The client sends one request
+            {"token": str, "path": str, "file_types": str, "text": str, "options": {SearchOptions fields}}
+        and receives one line per result (ProcessResult.to_dict), followed by {"end": true, "stats": {SearchStats}}
+        or {"error": str}. Closing the connection stops the search (noticed when the next result is sent).
+
+        Files are read with the permissions of the user running the daemon, so only that user may use it: the daemon
+        listens on a free port of the loopback interface and writes the port and a random token to 'endpoint_file'
+        (readable by the user only, see daemon_executor.write_endpoint). Requests without that token are rejected.
+
+        State shared by all clients:
+            - results per file (ResultCache), checked against the mtime and size of the file on every search
+            - file listings per path, file types and the options of the walk (archives, ignore rules): walked again
+              every 'poll_interval' seconds. New files are found after the next poll, deleted files are skipped (and
+              logged) until then. A listing not asked for during EXPIRE_POLLS polls is dropped, at most MAX_LISTINGS
+              are kept (the least recently asked for is dropped first): a search of a whole drive is not walked
+              again forever.
+            - trigram indexes of the paths searched with 'use_index': updated after every poll, so an indexed search
+              only has to stat the files. Indexed searches and updates of an index are done one at a time.
+
+    Attributes:
+        cache (ResultCache)
+        poll_interval (float): seconds between refreshes of the listings and indexes
+        token (str): secret the clients have to send
+        endpoint_file (str): file with the port and the token
+        _listings (dict[tuple, list[str]]): files per (path, file types, options of the walk)
+        _refreshed (dict[tuple, float]): time of the last walk per listing
+        _requested (dict[tuple, float]): time a listing was last asked for
+        _indexed (set[tuple]): listings of which the index is kept up to date
+        _lock (threading.Lock): protects the listings
+        _index_lock (threading.Lock): one indexed search or index update at a time
+        _wake (threading.Event): a new listing is wanted
+        _stop_event (threading.Event)
+        logger (Logger)
+    Args:
+        host (str)
+        port (int): 0 for a free port
+        cache_bytes (int): memory budget of the result cache
+        poll_interval (float)
+        endpoint_file (str)
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    POLL_INTERVAL = 60.0
+    CACHE_BYTES = 256 << 20
+    EXPIRE_POLLS = 3        # Polls after which a listing nobody asked for is dropped
+    MAX_LISTINGS = 8
+
+    def __init__(self, host: str = HOST, port: int = 0, cache_bytes: int = CACHE_BYTES, poll_interval: float = POLL_INTERVAL,
+                 endpoint_file: str = ENDPOINT_FILE):
+        super().__init__((host, port), _RequestHandler)
+
+        self.cache = ResultCache(cache_bytes)
+        self.poll_interval = poll_interval
+        self.token = secrets.token_hex(16)
+        self.endpoint_file = endpoint_file
+        self._listings = {}
+        self._refreshed = {}
+        self._requested = {}
+        self._indexed = set()
+        self._lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+
+        # Logging config
+        self.logger = logging.getLogger(__name__)
+
+        write_endpoint(self.server_address[1], self.token, endpoint_file)
+        threading.Thread(target = self._poll, name = "SearchDaemonPoll", daemon = True).start()
+
+    def shutdown(self):
+        self._stop_event.set()
+        self._wake.set()
+        super().shutdown()
+
+    def server_close(self):
+        remove_endpoint(self.token, self.endpoint_file)
+        super().server_close()
+
+    def authorized(self, token: str) -> bool:
+        return isinstance(token, str) and hmac.compare_digest(token, self.token)
+
+    def listing(self, path: str, file_types: str, options: SearchOptions) -> list[str]:
+        """ Return the known files of 'path', None when the path was not walked yet (it will be soon) """
+        key = (path, file_types, options.archives, options.exclude, options.max_size, options.gitignore)
+
+        with self._lock:
+            self._requested[key] = time.monotonic()
+            if options.use_index:
+                self._indexed.add(key)
+
+            files = self._listings.get(key)
+            if files is None and key not in self._listings:
+                self._listings[key] = None
+                self._wake.set()
+
+                # Make room: the listing asked for least recently goes
+                while len(self._listings) > SearchDaemon.MAX_LISTINGS:
+                    self._drop(min(self._listings, key = self._requested.get))
+            return files
+
+    def search(self, path: str, file_types: str, text: str, options: SearchOptions, send: Callable[[dict], None]):
+        """ Execute a search, 'send' is called with every message for the client """
+        # Profiles are not written on behalf of clients
+        options.profile = ""
+        files = self.listing(path, file_types, options)
+        stats = SearchStats()
+
+        with self._index_lock if options.use_index else contextlib.nullcontext():
+            try:
+                for result in search_api.search(path, file_types, text, options, self.cache, stats, files):
+                    send(result.to_dict())
+            except RuntimeError as e:
+                send({"error": str(e)})
+                return
+
+        send({"end": True, "stats": stats.to_dict()})
+
+    def _poll(self):
+        while not self._stop_event.is_set():
+            with self._lock:
+                # Listings nobody asks for any more are not walked again
+                expired = time.monotonic() - SearchDaemon.EXPIRE_POLLS * self.poll_interval
+                for key in [key for key in self._listings if self._requested[key] < expired]:
+                    self._drop(key)
+                keys = list(self._listings)
+
+            for key in keys:
+                if self._stop_event.is_set(): # Handle STOP
+                    return
+
+                # New listings right away, the others every 'poll_interval'
+                if time.monotonic() - self._refreshed.get(key, float("-inf")) >= self.poll_interval:
+                    self._refresh(key)
+
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _refresh(self, key: tuple):
+        start = time.perf_counter()
+        path, file_types, archives, exclude, max_size, gitignore = key
+        rules = IgnoreRules.create(exclude, max_size, gitignore)
+        files = list(FileWalker(path, file_types, self._stop_event.is_set, archives, rules).walk())
+
+        with self._lock:
+            # Dropped while it was walked
+            if key not in self._listings:
+                return
+            self._listings[key] = files
+            self._refreshed[key] = time.monotonic()
+            indexed = key in self._indexed
+        self.logger.debug(f"Listing of [{path}] ({file_types}) refreshed: {len(files)} files in {time.perf_counter() - start:.2f}s")
+
+        if indexed:
+            with self._index_lock:
+                try:
+                    index = TrigramIndex(path)
+                    try:
+                        index.update(files, self._stop_event.is_set)
+                    finally:
+                        index.close()
+                except (sqlite3.Error, OSError) as e:
+                    # E.g. locked by a search in another process: updated again after the next poll
+                    self.logger.error(f"Index of [{path}] not updated: {e}")
+
+    def _drop(self, key: tuple):
+        # Called with the lock held
+        self._listings.pop(key, None)
+        self._refreshed.pop(key, None)
+        self._requested.pop(key, None)
+        self._indexed.discard(key)
+        self.logger.debug(f"Listing of [{key[0]}] ({key[1]}) dropped")
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """ Handles the connection of a single client: one search request """
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            if not self.server.authorized(request.get("token")):
+                self.server.logger.warning(f"Rejected a request without a valid token from {self.client_address[0]}")
+                self._send({"error": "Not authorized"})
+                return
+
+            options = SearchOptions(**request.get("options", {}))
+            path, file_types, text = request["path"], request["file_types"], request["text"]
+            Query.compile(text, options.mode, options.max_errors)
+        except (ValueError, KeyError, TypeError, AttributeError, re.error) as e:
+            self._send({"error": f"Invalid request: {e}"})
+            return
+
+        try:
+            self.server.search(path, file_types, text, options, self._send)
+        except OSError as e:
+            # Client went away, closing the generator stopped the search
+            self.server.logger.debug(f"Client disconnected: {e}")
+
+    def _send(self, message: dict):
+        self.wfile.write((json.dumps(message) + "\n").encode("utf8"))
+
+
+def parse_args(args: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description = "ftsSearch daemon - keeps file listings, results and indexes warm for the GUI and the command line")
+    parser.add_argument("--port", type = int, default = 0, help = "local port to listen on (default: any free port, see the endpoint file)")
+    parser.add_argument("--poll", type = float, default = SearchDaemon.POLL_INTERVAL, metavar = "SECONDS",
+                        help = "seconds between refreshes of the file listings and indexes (default: %(default)s)")
+    parser.add_argument("--cache-mb", type = int, default = SearchDaemon.CACHE_BYTES >> 20, help = "memory budget of the result cache (default: %(default)s)")
+    return parser.parse_args(args)
+
+def main(args: list[str]) -> int:
+    args = parse_args(args)
+
+    logging.basicConfig(stream = sys.stderr, format = '%(asctime)s %(levelname)-8s %(message)s', datefmt = '%Y-%m-%d %H:%M:%S', level = logging.INFO)
+
+    # Terminated: leave through 'with', so the endpoint file is removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    with SearchDaemon(port = args.port, cache_bytes = args.cache_mb << 20, poll_interval = args.poll) as daemon:
+        daemon.logger.info(f"Listening on {HOST}:{daemon.server_address[1]} (endpoint in [{daemon.endpoint_file}])")
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+    return 0
+
+
+# Main processing
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,24 @@
+from dataclasses import dataclass
+
+@dataclass
+class SearchOptions:
+    """Class for keeping track of optional search settings"""
+    use_index: bool = False             # only scan files the persistent trigram index reports as candidates
+    workers: int = 1                    # number of worker processes; 1 searches in the executor thread, 0 uses all cores
+    engine: str = "mmap"                # "mmap": search the raw bytes of a file, "line": decode and search line by line
+    profile: str = ""                   # when set, the search is run under cProfile and the stats are dumped to this file
+    mode: str = "text"                  # how the search text is read: "text", "any" / "all" (whitespace separated terms), "regex" or "fuzzy"
+    max_errors: int = 1                 # mode "fuzzy": max. number of edits (insertions, deletions, substitutions) in a hit
+    read_ahead: int = 0                 # number of threads reading upcoming files in advance (slow / network filesystems), 0 = off
+    read_ahead_bytes: int = 64 << 20    # memory budget of the files read in advance
+    max_matches: int = 0                # stop the search after this number of results, 0 = no limit
+    max_lines: int = 0                  # found lines kept per file, 0 = no limit
+    max_seconds: float = 0.0            # stop the search after this wall clock time, 0 = no limit
+    archives: bool = False              # also search compressed files (.gz, .bz2, .xz) and the members of zip archives, decompressed
+    exclude: str = ""                   # comma separated gitignore style patterns of files and directories ('name/') to skip
+    gitignore: bool = False             # also skip what the .gitignore files found while walking exclude
+    max_size: int = 0                   # skip files larger than this number of bytes, 0 = no limit
+    skip_binary: bool = False           # skip files with a NUL byte in their first block (binary content)
+    dedup: bool = False                 # search a file once when several paths point to it (hard links, symlinks), report its result for every path
+    dedup_content: bool = False         # dedup: also collapse files with the same content (hashed when files have the same size)
+    top_k: int = 0                      # ranked: only the best N results (by score) are returned, best first, when the search ends; 0 = off
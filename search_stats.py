@@ -0,0 +1,102 @@
+import time
+from contextlib import contextmanager
+
+from process_result import ProcessResult
+
+class SearchStats:
+    """ Timings per phase and counters of a single search
+
+    Remarks:
+        Phases running in parallel (enumeration runs in its own thread, workers in their own process) are added up, so
+        the sum of the phases can be larger than the wall clock time of the search.
+
+        The 'line' engine reads, decodes and matches line by line: its time is booked as 'decode' as a whole.
+
+    Attributes:
+        timings (dict[str, float]): seconds spent per phase
+        files (int): files searched
+        cached (int): files answered from the result cache
+        bytes (int): bytes in the files searched
+        decode_errors (int): lines with a hit which are not valid UTF-8 (skipped)
+        binary_files (int): files skipped because of binary content
+        ignored (int): files and directories skipped by the ignore rules while walking
+        duplicates (int): paths not searched because they point to the same file (or content) as another path
+        matches (int): files with a match
+        lines (int): matching lines
+        truncated_files (int): results of which not all found lines were kept (limit per file)
+        truncated (str): why the search ended before all files were searched (a limit was reached), empty when complete
+        wall (float): seconds from start to end of the search
+    """
+
+    PHASES = ("enumerate", "index", "io", "decode", "match", "queue", "render")
+
+    def __init__(self):
+        self.timings = dict.fromkeys(SearchStats.PHASES, 0.0)
+        self.files = 0
+        self.cached = 0
+        self.bytes = 0
+        self.decode_errors = 0
+        self.binary_files = 0
+        self.ignored = 0
+        self.duplicates = 0
+        self.matches = 0
+        self.lines = 0
+        self.truncated_files = 0
+        self.truncated = ""
+        self.wall = 0.0
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - start
+
+    def merge(self, other: "SearchStats"):
+        """ Add the figures of 'other' (e.g. of a worker process) to these """
+        for name, seconds in other.timings.items():
+            self.timings[name] += seconds
+        self.files += other.files
+        self.cached += other.cached
+        self.bytes += other.bytes
+        self.decode_errors += other.decode_errors
+        self.binary_files += other.binary_files
+        self.ignored += other.ignored
+        self.duplicates += other.duplicates
+        self.matches += other.matches
+        self.lines += other.lines
+        self.truncated_files += other.truncated_files
+        self.truncated = self.truncated or other.truncated
+
+    def add_result(self, result: ProcessResult):
+        """ Count a result which was not searched by 'file_matcher' (e.g. from the cache) """
+        if result is not None:
+            self.matches += 1
+            self.lines += result.line_count
+            self.truncated_files += result.truncated
+
+    def to_dict(self) -> dict:
+        return {name: (dict(value) if name == "timings" else value) for name, value in vars(self).items()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SearchStats":
+        stats = cls()
+        for name, value in data.items():
+            if hasattr(stats, name):
+                setattr(stats, name, dict(value) if name == "timings" else value)
+        return stats
+
+    def summary(self) -> str:
+        phases = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.timings.items() if seconds >= 0.005)
+        cached = f" (+{self.cached} cached)" if self.cached else ""
+        truncated = f", {self.truncated_files} files with more lines than kept" if self.truncated_files else ""
+        if self.truncated:
+            truncated += f", truncated: {self.truncated}"
+        skipped = f", {self.binary_files} binary files" if self.binary_files else ""
+        if self.ignored:
+            skipped += f", {self.ignored} ignored"
+        if self.duplicates:
+            skipped += f", {self.duplicates} duplicates"
+        return (f"{self.files} files{cached}, {self.bytes / (1 << 20):.1f} MB, {self.lines} lines, {self.decode_errors} decode errors{skipped}"
+                f" in {self.wall:.2f}s ({phases or 'no timings'}){truncated}")
@@ -0,0 +1,68 @@
+import random
+
+import pytest
+
+from approximate import ApproximateMatcher
+
+def _distance(pattern: str, text: str) -> int:
+    """ Fewest edits of 'pattern' to any substring of 'text' (the plain dynamic programming table) """
+    previous = [0] * (len(text) + 1)
+    for row, char in enumerate(pattern, 1):
+        current = [row] + [0] * len(text)
+        for column in range(1, len(text) + 1):
+            current[column] = min(previous[column] + 1, current[column - 1] + 1,
+                                  previous[column - 1] + (char != text[column - 1]))
+        previous = current
+    return min(previous)
+
+@pytest.mark.parametrize("max_errors", [1, 2])
+def test_find_agrees_with_dynamic_programming(max_errors):
+    rng = random.Random(max_errors)
+    for _ in range(3000):
+        pattern = "".join(rng.choice("abc") for _ in range(rng.randint(2 * (max_errors + 1), 8)))
+        text = "".join(rng.choice("abc\n") for _ in range(rng.randint(0, 20)))
+
+        position, length, edits = ApproximateMatcher(pattern, max_errors).find(text)
+
+        best = min(_distance(pattern, line) for line in text.split("\n"))
+        if best > max_errors:
+            assert position == -1, (pattern, text)
+            continue
+
+        assert position != -1, (pattern, text)
+        hit = text[position:position + length]
+        assert "\n" not in hit
+        assert edits <= max_errors
+        assert _distance(pattern, hit) == edits, (pattern, text, hit)
+
+def test_bytes_give_the_same_result():
+    rng = random.Random(0)
+    for _ in range(1000):
+        matcher = ApproximateMatcher("".join(rng.choice("abc") for _ in range(rng.randint(4, 8))), 1)
+        text = "".join(rng.choice("abc\n") for _ in range(rng.randint(0, 30)))
+        assert matcher.find(text.encode("ascii")) == matcher.find(text)
+
+def test_find_within_bounds():
+    matcher = ApproximateMatcher("needle", 1)
+    text = "needle x neadle"
+    assert matcher.find(text) == (0, 6, 0)
+    assert matcher.find(text, 7) == (9, 6, 1)
+    assert matcher.find(text, 7, 12) == (-1, 0, 0)
+
+def test_exact_match_preferred_over_edits():
+    position, length, edits = ApproximateMatcher("needle", 2).find("needle")
+    assert (position, length, edits) == (0, 6, 0)
+
+def test_match_does_not_span_lines():
+    assert ApproximateMatcher("needle", 1).find("nee\ndle") == (-1, 0, 0)
+
+def test_occurs_filters_on_the_pieces():
+    matcher = ApproximateMatcher("abcdef", 1)
+    assert "".join(matcher.pieces) == "abcdef"
+    assert matcher.occurs("xxabcxx")
+    assert not matcher.occurs("acebdf")
+
+@pytest.mark.parametrize("pattern, max_errors", [("abc", 1), ("abcde", 2), ("a", 0)])
+def test_pattern_too_short(pattern, max_errors):
+    with pytest.raises(ValueError):
+        ApproximateMatcher(pattern, max_errors)
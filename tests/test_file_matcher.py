@@ -0,0 +1,78 @@
+import random
+import logging
+import itertools
+
+import pytest
+
+import file_matcher
+from search_options import SearchOptions
+from search_stats import SearchStats
+
+logger = logging.getLogger(__name__)
+
+def _search(path: str, text: str, engine: str, **options) -> tuple:
+    stats = SearchStats()
+    result = file_matcher.search_file(path, text, SearchOptions(engine = engine, **options), logger, stats)
+    found = None
+    if result is not None:
+        found = (result.dat, result.truncated, result.terms, result.distance, list(result.spans or ()))
+    return (found, stats.decode_errors, stats.binary_files)
+
+def _assert_same(path: str, text: str, **options):
+    # The byte engine has to give the same result as the line engine, whatever it hands back to it
+    assert _search(path, text, "mmap", **options) == _search(path, text, "line", **options), (path, text, options)
+
+@pytest.mark.parametrize("content", [
+    b"one needle\r\ntwo\r\nNEEDLE three\r\n",
+    b"single\rcarriage needle\rreturns\n",
+    b"valid needle\n\xff\xfe needle in invalid\nnot here\n",
+    b"The \xe2\x84\xaaelvin scale\nplain kelvin\n",
+    b"\xc4\xb0stanbul needle\n",
+    b"no newline at the end needle",
+    b"\x00binary needle\n",
+    b"",
+])
+def test_engines_agree_on_special_content(tmp_path, content):
+    path = tmp_path / "a.md"
+    path.write_bytes(content)
+    for text, mode in [("needle", "text"), ("kelvin", "text"), ("needle kelvin", "any"), ("needle stanbul", "all"),
+                       ("neadle", "fuzzy")]:
+        _assert_same(str(path), text, mode = mode)
+        _assert_same(str(path), text, mode = mode, max_lines = 1, skip_binary = True)
+
+def test_engines_agree_on_random_content(tmp_path):
+    words = [b"ab", b"cd", b"x", b"AB", b"abcd", b" ", b"\r\n", b"\r", b"\xff", b"\xc3\xa9", b"\xe2\x84\xaa"]
+    rng = random.Random(0)
+    path = tmp_path / "a.md"
+    for _ in range(1500):
+        path.write_bytes(b"".join(rng.choice(words) if rng.random() > 0.15 else b"\n" for _ in range(rng.randint(0, 60))))
+        mode = rng.choice(["text", "any", "all", "fuzzy"])
+        text = {"text": rng.choice(["ab", "cd", "bc", "k"]), "any": rng.choice(["ab cd", "x ab"]),
+                "all": rng.choice(["ab cd", "x ab", "ab abcd"]), "fuzzy": rng.choice(["abcd", "abxd"])}[mode]
+        _assert_same(str(path), text, mode = mode, max_lines = rng.choice([0, 1, 2, 3]))
+
+def test_byte_engine_result_is_compact(tmp_path):
+    path = tmp_path / "a.md"
+    path.write_bytes(b"first\nsecond needle\n")
+    result = file_matcher.search_file(str(path), "needle", SearchOptions(), logger)
+    assert result.is_compact()
+    assert result.dat == ["2: second needle\n"]
+    assert list(result.spans) == [0, 7, 6]
+
+def test_line_limit(tmp_path):
+    path = tmp_path / "a.md"
+    path.write_bytes(b"needle\n" * 5)
+    for engine in ("mmap", "line"):
+        result = file_matcher.search_file(str(path), "needle", SearchOptions(engine = engine, max_lines = 2), logger)
+        assert result.line_count == 2 and result.truncated
+
+def test_stopped(tmp_path):
+    path = tmp_path / "a.md"
+    lines = file_matcher.CHECK_LINES * 3
+    path.write_bytes(b"needle\n" * lines)
+    for engine in ("mmap", "line"):
+        # Stopped after the first check: the lines found so far are returned
+        checks = itertools.chain([False], itertools.repeat(True))
+        result = file_matcher.search_file(str(path), "needle", SearchOptions(engine = engine), logger, stopped = lambda: next(checks))
+        assert result.truncated
+        assert 0 < result.line_count < lines
@@ -0,0 +1,88 @@
+import re
+
+import pytest
+
+from ignore_rules import IgnoreRules, _Rule, _translate
+
+@pytest.mark.parametrize("pattern, path, expected", [
+    ("*.md", "a.md", True),
+    ("*.md", "dir/a.md", False),
+    ("a?c", "abc", True),
+    ("a?c", "a/c", False),
+    ("**/tmp", "tmp", True),
+    ("**/tmp", "a/b/tmp", True),
+    ("a/**/b", "a/b", True),
+    ("a/**/b", "a/x/y/b", True),
+    ("a/**/b", "ab", False),
+    ("a/**", "a/x/y", True),
+    ("[abc].md", "b.md", True),
+    ("[abc].md", "d.md", False),
+    ("[!abc].md", "d.md", True),
+    ("[!abc].md", "a.md", False),
+    ("\\#file", "#file", True),
+    ("\\*", "*", True),
+    ("\\*", "x", False),
+    ("a+b(c).md", "a+b(c).md", True),
+])
+def test_translate(pattern, path, expected):
+    assert (re.fullmatch(_translate(pattern), path) is not None) == expected
+
+@pytest.mark.parametrize("line", ["", "   ", "# comment", "/", "!"])
+def test_nothing_to_parse(line):
+    assert _Rule.parse(line) is None
+
+def test_name_pattern_matches_at_any_depth():
+    rules = IgnoreRules(["*.log"])
+    assert rules.excluded("a.log", "a.log", False)
+    assert rules.excluded("x/y/a.log", "a.log", False)
+    assert not rules.excluded("a.log.md", "a.log.md", False)
+
+def test_directory_pattern():
+    rules = IgnoreRules(["build/"])
+    assert rules.excluded("build", "build", True)
+    assert rules.excluded("src/build", "build", True)
+    assert not rules.excluded("build", "build", False)
+
+def test_anchored_pattern():
+    rules = IgnoreRules(["docs/*.md", "/top.md"])
+    assert rules.excluded("docs/a.md", "a.md", False)
+    assert not rules.excluded("docs/x/a.md", "a.md", False)
+    assert not rules.excluded("sub/docs/a.md", "a.md", False)
+    assert rules.excluded("top.md", "top.md", False)
+    assert not rules.excluded("sub/top.md", "top.md", False)
+
+def test_last_matching_pattern_decides():
+    rules = IgnoreRules(["*.md", "!keep.md"])
+    assert rules.excluded("a.md", "a.md", False)
+    assert not rules.excluded("keep.md", "keep.md", False)
+
+    rules = IgnoreRules(["!keep.md", "*.md"])
+    assert rules.excluded("keep.md", "keep.md", False)
+
+def test_create():
+    assert IgnoreRules.create("", 0, False) is None
+    assert IgnoreRules.create(" , ", 0, False) is None
+    rules = IgnoreRules.create("*.tmp, build/", 0, False)
+    assert rules.excluded("a.tmp", "a.tmp", False)
+    assert rules.excluded("build", "build", True)
+
+def test_gitignore_applies_below_its_directory(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / ".gitignore").write_text("# generated\n*.out\n/local.md\n!keep.out\n", encoding = "utf8")
+
+    root = IgnoreRules(gitignore = True)
+    rules = root.for_directory(str(tmp_path), "").for_directory(str(tmp_path / "sub"), "sub")
+    assert rules.excluded("sub/a.out", "a.out", False)
+    assert rules.excluded("sub/deeper/a.out", "a.out", False)
+    assert not rules.excluded("sub/keep.out", "keep.out", False)
+    assert rules.excluded("sub/local.md", "local.md", False)
+    assert not rules.excluded("sub/deeper/local.md", "local.md", False)
+    assert not rules.excluded("other/local.md", "local.md", False)
+
+    # The rules of the parent are not changed
+    assert not root.excluded("a.out", "a.out", False)
+
+def test_gitignore_not_read_when_off(tmp_path):
+    (tmp_path / ".gitignore").write_text("*.md\n", encoding = "utf8")
+    rules = IgnoreRules(["*.tmp"])
+    assert rules.for_directory(str(tmp_path), "") is rules
@@ -0,0 +1,79 @@
+import re
+import random
+
+import pytest
+
+from query import Query
+
+@pytest.mark.parametrize("text, mode", [("", "text"), ("   ", "any"), ("x", "unknown"), ("a*", "regex"), ("x|", "regex"),
+                                        ("abc", "fuzzy")])
+def test_invalid_queries(text, mode):
+    with pytest.raises(ValueError):
+        Query(text, mode)
+
+def test_invalid_regex():
+    with pytest.raises(re.error):
+        Query("(", "regex")
+
+def test_terms():
+    query = Query("foo bar foo", "any")
+    assert query.terms == ["foo", "bar"]
+    assert query.find("xx bar foo", 0) == (3, 3, 1)
+
+def test_all_needs_every_term():
+    query = Query("foo bar", "all")
+    assert not query.accepts({0})
+    assert query.accepts({0, 1})
+
+def test_longer_term_covers_the_shorter():
+    # The regex reports "foobar" only, "foo" is found as well
+    query = Query("foo foobar", "all")
+    position, length, term = query.find("foobar", 0)
+    assert (position, length) == (0, 6)
+    assert query.accepts({term})
+    assert query.matched_terms({term}) == ("foo", "foobar")
+
+def test_path_is_matched_case_sensitive():
+    assert Query("Docs").in_path("/x/Docs/a.md")
+    assert not Query("docs").in_path("/x/Docs/a.md")
+    assert Query("docs", "regex").in_path("/x/Docs/a.md")
+    assert Query("a b", "all").in_path("/a/b.md")
+    assert not Query("a c", "all").in_path("/a/b.md")
+
+def test_bytes_supported():
+    assert Query("needle").bytes_supported()
+    assert Query("needle hay", "any").bytes_supported()
+    assert Query("needle", "fuzzy").bytes_supported()
+    assert not Query("grün").bytes_supported()
+    assert not Query("needle", "regex").bytes_supported()
+
+def test_unfolded():
+    kelvin = "K".encode("utf8")
+    dotted_i = "İ".encode("utf8")
+    assert Query("kelvin").unfolded(b"a " + kelvin + b"elvin")
+    assert not Query("kelvin").unfolded(b"kelvin")
+    assert not Query("needle").unfolded(kelvin + dotted_i)
+    assert Query("in").unfolded(dotted_i)
+    assert Query("needle", "fuzzy").unfolded(kelvin)
+
+@pytest.mark.parametrize("text, mode", [("ab", "text"), ("ab cd", "any"), ("ab abc", "all"), ("abcd", "fuzzy")])
+def test_block_finder_agrees_with_find(text, mode):
+    query = Query(text, mode)
+    rng = random.Random(text)
+    for _ in range(500):
+        block = "".join(rng.choice(["ab", "cd", "c", "x", "\n", "abd"]) for _ in range(rng.randint(0, 30)))
+        find = query.block_finder(block.encode("ascii"))
+
+        expected = []
+        position, length, term = query.find(block, 0)
+        while position != -1:
+            expected.append((position, length, term))
+            position, length, term = query.find(block, position + (length or 1))
+
+        found = []
+        if find is not None:
+            position, length, term = find(0)
+            while position != -1:
+                found.append((position, length, term))
+                position, length, term = find(position + (length or 1))
+        assert found == expected, block
@@ -0,0 +1,191 @@
+import os
+import hashlib
+import logging
+import sqlite3
+from typing import Callable, Iterable
+
+import archive_reader
+from query import Query
+
+class TrigramIndex:
+    """ Persistent trigram index for a single search root
+
+    Remarks:
+        Every file is stored together with its mtime and size. Only files of which one of both changed since the last
+        update are read again, so refreshing an already indexed root mostly costs a 'stat' per file.
+
+        The index is only used as a filter: it returns a superset of the files that contain the search text
+        (trigrams are taken from the lowercased content). The actual matching is still done by the executor.
+
+        Compressed files and archives (see archive_reader) are not indexed: the caller has to search those anyway.
+
+    Attributes:
+        root (str): the search root this index belongs to
+        db_file (str): location of the sqlite database on disk
+        logger (Logger)
+    Args:
+        root (str)
+        index_dir (str): directory in which the index databases are kept
+    """
+
+    INDEX_DIR = os.path.join(os.path.expanduser("~"), ".fts_search", "index")
+    CHUNK_SIZE = 1 << 20    # Characters read at once while indexing a file
+    COMMIT_EVERY = 200      # Number of indexed files after which the changes are committed
+
+    def __init__(self, root: str, index_dir: str = None):
+        self.root = os.path.abspath(root)
+
+        index_dir = index_dir or TrigramIndex.INDEX_DIR
+        os.makedirs(index_dir, exist_ok = True)
+
+        # One database per search root
+        digest = hashlib.sha1(os.path.normcase(self.root).encode("utf8")).hexdigest()
+        self.db_file = os.path.join(index_dir, digest + ".sqlite")
+
+        self._con = sqlite3.connect(self.db_file)
+        self._con.executescript("""
+            CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, mtime INTEGER, size INTEGER);
+            CREATE TABLE IF NOT EXISTS trigrams (tri TEXT NOT NULL, file_id INTEGER NOT NULL, PRIMARY KEY (tri, file_id)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS trigrams_file ON trigrams (file_id);
+        """)
+
+        # Logging config
+        self.logger = logging.getLogger(__name__)
+
+    def close(self):
+        self._con.close()
+
+    def update(self, files: Iterable[str], stopped: Callable[[], bool] = None) -> bool:
+        """ Bring the index up to date for the given files
+
+            Files which are new or of which the mtime/size changed are (re)indexed. Files which are known in the index,
+            but do no longer exist, are removed.
+
+            Returns False when the update was interrupted through 'stopped', True otherwise.
+        """
+        known = {path: (file_id, mtime, size) for file_id, path, mtime, size in self._con.execute("SELECT id, path, mtime, size FROM files")}
+        seen = set()
+        changed = 0
+
+        for file in files:
+            if stopped is not None and stopped(): # Handle STOP
+                self._con.commit()
+                return False
+
+            seen.add(file)
+            if archive_reader.is_archived(file):
+                continue
+
+            try:
+                stat = os.stat(file)
+            except OSError as e:
+                self.logger.error(f"Error while indexing file [{file}]: {e}")
+                continue
+
+            entry = known.get(file)
+            if entry is not None and entry[1] == stat.st_mtime_ns and entry[2] == stat.st_size:
+                continue
+
+            self._index_file(file, stat, entry[0] if entry is not None else None)
+
+            changed += 1
+            if changed % TrigramIndex.COMMIT_EVERY == 0:
+                self._con.commit()
+
+        # Remove files which no longer exist (files of other file types are kept)
+        for path, (file_id, _, _) in known.items():
+            if path not in seen and not os.path.exists(path):
+                self._con.execute("DELETE FROM trigrams WHERE file_id = ?", (file_id,))
+                self._con.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+        self._con.commit()
+        self.logger.debug(f"Index [{self.db_file}] updated ({changed} files re-indexed)")
+
+        return True
+
+    def candidates(self, text: str) -> set[str]:
+        """ Return the indexed files which might contain 'text' in their content or in their path
+
+            Returns None when 'text' is too short to be looked up (no filtering possible).
+        """
+        trigrams = TrigramIndex.trigrams(text.lower())
+        if len(trigrams) == 0:
+            return None
+
+        # Files of which the path contains the text (case sensitive, like the executor does)
+        found = {path for (path,) in self._con.execute("SELECT path FROM files WHERE instr(path, ?) > 0", (text,))}
+
+        placeholders = ",".join("?" * len(trigrams))
+        query = f"""SELECT f.path FROM trigrams t JOIN files f ON f.id = t.file_id
+                    WHERE t.tri IN ({placeholders}) GROUP BY t.file_id HAVING COUNT(*) = ?"""
+        found.update(path for (path,) in self._con.execute(query, (*trigrams, len(trigrams))))
+
+        return found
+
+    def query_candidates(self, query: Query) -> set[str]:
+        """ Return the indexed files which might match 'query', None when no filtering is possible
+
+            'any' takes the union of the candidates of the terms, 'all' the intersection (a term too short to be looked
+            up doesn't narrow it down). 'fuzzy' takes the union of the candidates of the pieces of which one occurs
+            unchanged in every hit. A regular expression is not looked up.
+        """
+        if query.mode == "regex":
+            return None
+        if query.mode == "text":
+            return self.candidates(query.text)
+        if query.mode == "fuzzy":
+            return self._fuzzy_candidates(query)
+
+        found = None
+        for term in query.text.split():
+            candidates = self.candidates(term)
+            if query.mode == "any":
+                if candidates is None:
+                    return None
+                found = candidates if found is None else found | candidates
+            elif candidates is not None:
+                found = candidates if found is None else found & candidates
+
+        return found
+
+    def _fuzzy_candidates(self, query: Query) -> set[str]:
+        # The pieces are lowercased: the files of which the (case sensitive) path contains the search text are added
+        found = self.candidates(query.text)
+        for piece in query.matcher.pieces:
+            candidates = self.candidates(piece)
+            if found is None or candidates is None:
+                return None
+            found |= candidates
+        return found
+
+    @staticmethod
+    def trigrams(text: str) -> set[str]:
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def _index_file(self, file: str, stat: os.stat_result, file_id: int):
+        trigrams = set()
+
+        try:
+            # Undecodable bytes are replaced: the index only has to be a superset of what the executor can find
+            with open(file, "r", encoding = "utf8", errors = "replace") as reader:
+                tail = ""
+                while True:
+                    chunk = reader.read(TrigramIndex.CHUNK_SIZE)
+                    if chunk == "":
+                        break
+
+                    # Keep the last 2 characters to catch trigrams crossing the chunk boundary
+                    chunk = tail + chunk.lower()
+                    trigrams.update(TrigramIndex.trigrams(chunk))
+                    tail = chunk[-2:]
+        except OSError as e:
+            self.logger.error(f"Error while indexing file [{file}]: {e}")
+            return
+
+        if file_id is None:
+            file_id = self._con.execute("INSERT INTO files (path, mtime, size) VALUES (?, ?, ?)", (file, stat.st_mtime_ns, stat.st_size)).lastrowid
+        else:
+            self._con.execute("UPDATE files SET mtime = ?, size = ? WHERE id = ?", (stat.st_mtime_ns, stat.st_size, file_id))
+            self._con.execute("DELETE FROM trigrams WHERE file_id = ?", (file_id,))
+
+        self._con.executemany("INSERT INTO trigrams (tri, file_id) VALUES (?, ?)", ((tri, file_id) for tri in trigrams))